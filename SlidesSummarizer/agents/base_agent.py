@@ -12,6 +12,7 @@ class Agent:
     def __init__(self, config, model=None):
         self.config = config
         self.messages = None
+        self.last_usage = None
         if model is not None:
             self.model:BaseModel = model
         else:
@@ -28,7 +29,9 @@ class Agent:
             texts = None
         if not self.config.agent.use_image:
             images = None
+        self.model.last_usage = None
         generated_ans, messages = self.model.predict(question, texts, images, self.messages)
+        self.last_usage = self.model.last_usage
         if add_to_message:
             self.messages = messages
         return generated_ans, messages
@@ -4,21 +4,39 @@ import importlib
 import json
 import torch
 import os
+import time
 from agents.multi_agent_system import MultiAgentSystem
 from agents.base_agent import Agent
 from mydatasets.base_dataset import BaseDataset
+from mydatasets.page_planner import PagePlanner
 
 class SlidesSummaryAgent(MultiAgentSystem):
     def __init__(self, config):
         super().__init__(config)
     
-    def predict(self, dataset:BaseDataset):
+    def predict(self, dataset:BaseDataset, progress_callback=None):
+        start = time.time()
+        def agent_done(agent_name, agent):
+            # progress_callback(event, data) 在每个 agent 完成后调用, usage 为模型返回的 token 数 (若有)
+            nonlocal start
+            if progress_callback:
+                progress_callback("agent_done", {
+                    "agent": agent_name,
+                    "seconds": time.time() - start,
+                    "usage": agent.last_usage
+                })
+            start = time.time()
+
         general_agent = self.agents[-1]
         pdf = dataset.get_pdf()
-        general_response, messages = general_agent.predict("", None, pdf, with_sys_prompt=True)
+        planner = PagePlanner(dataset)
+        general_images, general_texts = self.plan_inputs(dataset, planner, general_agent, pdf)
+        general_response, messages = general_agent.predict("", general_texts, general_images, with_sys_prompt=True)
         print("### General Agent: "+ general_response)
+        agent_done("general_agent", general_agent)
         critical_info = general_agent.self_reflect(prompt = general_agent.config.agent.critical_prompt, add_to_message=False)
         print("### General Critical Agent: " + critical_info)
+        agent_done("critical_agent", general_agent)
 
         start_index = critical_info.find('{') 
         end_index = critical_info.find('}') + 1 
@@ -39,17 +57,41 @@ class SlidesSummaryAgent(MultiAgentSystem):
         relect_prompt = "\nYou may use the given clue:\n"
         full_text = dataset.get_full_text()
         full_images = dataset.get_retrival_images()
-        text_response, messages = text_agent.predict(relect_prompt +text_reflection, texts = None, images = pdf, with_sys_prompt=True)
+        text_images, text_texts = self.plan_inputs(dataset, planner, text_agent, pdf)
+        text_response, messages = text_agent.predict(relect_prompt +text_reflection, texts = text_texts, images = text_images, with_sys_prompt=True)
         all_messages += "Text Agent:\n" + text_response + "\n"
+        agent_done("text_agent", text_agent)
+        image_budget = image_agent.config.agent.get("page_budget")
+        if image_budget is not None:
+            # 检索结果 (模型结构页面在前，各自按得分排列) 超出预算时截断
+            full_images = full_images[:max(1, image_budget // planner.image_tokens_per_page)]
         image_response, messages = image_agent.predict(relect_prompt +image_reflection, texts = None, images = full_images, with_sys_prompt=True)
         all_messages += "Image Agent:\n" + image_response + "\n"
+        agent_done("image_agent", image_agent)
             
         # print("### Text Agent: " + text_response)
         # print("### Image Agent: " + image_response)
         summary, all_messages = self.sum_agent.predict(all_messages)
+        agent_done("sum_agent", self.sum_agent)
 
         return summary, all_messages
     
+    def plan_inputs(self, dataset, planner, agent, pdf):
+        """
+        Page images and text chunks for an agent within its page_budget. With no
+        budget, or when every page fits, the agent gets all pages and no text.
+        """
+        budget = agent.config.agent.get("page_budget")
+        if planner.fits(budget):
+            return pdf, None
+        plan = planner.plan(budget, use_text=agent.config.agent.use_text)
+        print(f"[INFO] Page budget {budget}: {len(plan.pages)} of {len(pdf)} pages, {len(plan.texts)} text chunks")
+        if os.path.exists(dataset.pdf_path):
+            images = dataset.page_images(plan.pages)
+        else:
+            images = [pdf[page_num - 1] for page_num in plan.pages]
+        return images, plan.texts or None
+    
     def clean_messages(self):
         for agent in self.agents:
             agent.clean_messages()
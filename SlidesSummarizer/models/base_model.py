@@ -1,4 +1,17 @@
+import os
 import torch
+
+# 页面图片的 MIME 类型 (见 scripts/render_profiles.py 的 IMAGE_CODECS)
+IMAGE_MIME_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+}
+
+def image_mime_type(image_path):
+    return IMAGE_MIME_TYPES.get(os.path.splitext(image_path)[1].lower(), "image/png")
+
 class BaseModel():
     def __init__(self, config):
         """
@@ -6,10 +19,26 @@ class BaseModel():
         :param config: A dictionary containing model configuration parameters.
         """
         self.config = config
+        # token usage of the last predict call, None if the backend does not report it
+        self.last_usage = None
         
     def predict(self, question, texts = None, images = None, history = None):
         pass
     
+    def record_usage(self, prompt_tokens, completion_tokens):
+        self.last_usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+        }
+    
+    def record_api_usage(self, response):
+        """Record token usage from an OpenAI-compatible chat completion response"""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            self.last_usage = None
+            return
+        self.record_usage(usage.prompt_tokens, usage.completion_tokens)
+    
     def clean_up(self):
         torch.cuda.empty_cache()
         
@@ -69,6 +69,7 @@ class DeepSeekAPI(BaseModel):
              #  max_tokens=self.config.max_new_tokens,
             )
             result = response.choices[0].message.content
+            self.record_api_usage(response)
             messages.append(self.create_ans_message(result))
             return result, messages
             
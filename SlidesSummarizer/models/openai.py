@@ -1,4 +1,4 @@
-from models.base_model import BaseModel
+from models.base_model import BaseModel, image_mime_type
 from openai import OpenAI
 import base64
 import os
@@ -41,7 +41,7 @@ class MyOpenAI(BaseModel):
     def create_image_message(self, images, question):
         content = []
         for image_path in images:
-            content.append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{encode_image(image_path)}"}})
+            content.append({"type": "image_url", "image_url": {"url": f"data:{image_mime_type(image_path)};base64,{encode_image(image_path)}"}})
         content.append({"type": "text", "text": question})
         message = {
             "role": "user",
@@ -59,6 +59,7 @@ class MyOpenAI(BaseModel):
             max_tokens=self.config.max_new_tokens,
         )
         result = response.choices[0].message.content
+        self.record_api_usage(response)
         messages.append(self.create_ans_message(result))
         return result, messages
     
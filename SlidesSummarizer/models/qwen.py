@@ -71,6 +71,7 @@ class Qwen2VL(BaseModel):
         output_text = self.processor.batch_decode(
             generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False
         )[0]
+        self.record_usage(inputs.input_ids.shape[1], len(generated_ids_trimmed[0]))
         messages.append(self.create_ans_message(output_text))
         self.clean_up()
         return output_text, messages
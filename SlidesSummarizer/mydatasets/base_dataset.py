@@ -3,9 +3,22 @@ import os
 from PIL import Image
 from datetime import datetime
 import glob
+from mydatasets.page_images import LazyPageImages, page_image_cache
+from scripts.figures import FIGURES_FILE
+from scripts.page_store import PageStore, page_store_path
+from scripts.render_profiles import page_filename, page_num_from_name
 
 class BaseDataset():
-    def __init__(self, paper_name, data_folder="data", max_character_per_page=4000):
+    def __init__(
+        self,
+        paper_name,
+        data_folder="data",
+        max_character_per_page=4000,
+        retrieval_image_profile="hires",
+        image_codec="png",
+        image_quality=None,
+        use_figures=False
+    ):
         """
         Initialize the dataset for a single paper
         
@@ -13,23 +26,37 @@ class BaseDataset():
             paper_name: Name of the paper (folder name)
             data_folder: Path to the data folder containing papers
             max_character_per_page: Maximum characters per page
+            retrieval_image_profile: Render profile for retrieved pages
+            image_codec: Codec for pages rendered on demand (png, jpeg, webp)
+            image_quality: Encoder quality (1-100) for jpeg and webp
+            use_figures: Give retrieved pages as their figure crops (figures.json,
+                written by extract_paper --figures); pages without figures
+                are still given whole
         """
         self.paper_name = paper_name
         self.data_folder = data_folder
         self.paper_folder = os.path.join(data_folder, paper_name)
+        self.pdf_path = os.path.join(self.paper_folder, f"{paper_name}.pdf")
+        self.retrieval_image_profile = retrieval_image_profile
+        self.image_codec = image_codec
+        self.image_quality = image_quality
+        self.use_figures = use_figures
         
         # Check if paper folder exists
         if not os.path.exists(self.paper_folder):
             raise ValueError(f"Paper folder not found: {self.paper_folder}")
             
-        # Check for content.json
+        # Check for pages.bin or content.json
         self.content_file = os.path.join(self.paper_folder, "content.json")
-        if not os.path.exists(self.content_file):
+        self.page_store_file = page_store_path(self.paper_folder)
+        self.page_store = PageStore(self.page_store_file) if os.path.exists(self.page_store_file) else None
+        if self.page_store is None and not os.path.exists(self.content_file):
             raise ValueError(f"Content file not found: {self.content_file}")
         
         # Set paths for retrieval files
         self.model_structure_file = os.path.join(self.paper_folder, "retrieval", "model_structure_pages.json")
         self.experiment_results_file = os.path.join(self.paper_folder, "retrieval", "experiment_results_pages.json")
+        self.figures_file = os.path.join(self.paper_folder, FIGURES_FILE)
         
         # Set configuration parameters
         self.max_character_per_page = max_character_per_page
@@ -41,13 +68,55 @@ class BaseDataset():
         current_time = datetime.now()
         self.time = current_time.strftime("%Y-%m-%d-%H-%M")
     
+    def page_image(self, page_num, profile_name="vlm"):
+        """
+        Get the path to one page image. Profiles packed into pages.bin are
+        served from the store; others are rendered from the PDF on first use
+        
+        Args:
+            page_num: 1-based page number
+            profile_name: Render profile (see scripts/render_profiles.py)
+            
+        Returns:
+            Path to the page image
+        """
+        data = self.page_image_bytes(page_num, profile_name)
+        if data is not None:
+            # 已打包的页面直接写出，不再从 PDF 渲染
+            return page_image_cache.get_packed(
+                data, self.paper_folder, profile_name, self.page_store.image_name(page_num, profile_name)
+            )
+        if os.path.exists(self.pdf_path):
+            return page_image_cache.get(
+                self.pdf_path, self.paper_folder, page_num, profile_name, self.image_codec, self.image_quality
+            )
+        # papers extracted without a kept PDF only have pre-rendered images
+        return os.path.join(self.paper_folder, "images", page_filename(page_num))
+    
+    def page_images(self, page_nums, profile_name="vlm"):
+        """
+        Get a lazy list of page images
+        
+        Args:
+            page_nums: 1-based page numbers
+            profile_name: Render profile (see scripts/render_profiles.py)
+            
+        Returns:
+            LazyPageImages rendering each page when it is read
+        """
+        return LazyPageImages(self, [(page_num, profile_name) for page_num in page_nums])
+    
     def get_pdf(self):
         """
         Get the path to the paper's PDF file
         
         Returns:
-            List of paths to all images in the images folder
+            List of paths to all page images. When the PDF is available the
+            list is lazy: each page is rendered when it is read.
         """
+        if os.path.exists(self.pdf_path):
+            return self.page_images([page["page_num"] for page in self.content.get("pages", [])])
+        
         pdf_images_path = os.path.join(self.data_folder, self.paper_name, "images")
         if not os.path.exists(pdf_images_path):
             raise ValueError(f"Images folder not found: {pdf_images_path}")
@@ -55,7 +124,7 @@ class BaseDataset():
         # 获取images文件夹下所有图片路径
         image_paths = []
         for file_name in sorted(os.listdir(pdf_images_path)):
-            if file_name.lower().endswith(('.png', '.jpg', '.jpeg')):
+            if file_name.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')):
                 image_path = os.path.join(pdf_images_path, file_name)
                 image_paths.append(image_path)
         
@@ -64,13 +133,31 @@ class BaseDataset():
         
         return image_paths
     
+    def page_image_bytes(self, page_num, profile_name="retrieval"):
+        """
+        Get the encoded image of a page packed into pages.bin, without copying it
+        
+        Args:
+            page_num: 1-based page number
+            profile_name: Render profile (see scripts/render_profiles.py)
+            
+        Returns:
+            memoryview over the image bytes, or None if the page store does not hold it
+        """
+        if self.page_store is None or str(page_num) not in self.page_store.index["pages"]:
+            return None
+        return self.page_store.image(page_num, profile_name)
+    
     def load_paper_content(self):
         """
-        Load paper content from content.json
+        Load paper content from pages.bin, or from content.json for papers
+        extracted without a page store
         
         Returns:
             Dictionary containing paper content
         """
+        if self.page_store is not None:
+            return self.page_store.content()
         try:
             with open(self.content_file, 'r', encoding='utf-8') as f:
                 content = json.load(f)
@@ -95,7 +182,88 @@ class BaseDataset():
             full_text += page_text + " "
             
         return full_text.strip()
-    
+
+    def get_structure(self):
+        """
+        Get the layout structure of the paper (see scripts/layout.py)
+
+        Returns:
+            Dictionary with abstract, sections, captions, tables and references;
+            empty for papers extracted before the structure was recorded
+        """
+        return self.content.get("structure") or {}
+
+    def get_abstract(self):
+        """
+        Get the abstract of the paper
+
+        Returns:
+            Abstract text, or an empty string if it was not found
+        """
+        return self.get_structure().get("abstract", "")
+
+    def get_sections(self, *names):
+        """
+        Get sections whose title contains any of the given names (case
+        insensitive), e.g. get_sections("method", "experiment")
+
+        Args:
+            names: Title fragments; all sections when none are given
+
+        Returns:
+            List of section dictionaries (id, number, title, level, page_start, page_end, text)
+        """
+        sections = self.get_structure().get("sections", [])
+        if not names:
+            return sections
+        names = [name.lower() for name in names]
+        return [section for section in sections if any(name in section["title"].lower() for name in names)]
+
+    def get_section_text(self, *names):
+        """
+        Get the text of the sections matching names, each preceded by its title.
+        Falls back to the full text when the paper has no structure.
+
+        Returns:
+            String containing the selected sections
+        """
+        if not self.get_structure():
+            return self.get_full_text()
+        return "\n\n".join(
+            f"{section['title']}\n{section['text']}".strip() for section in self.get_sections(*names)
+        )
+
+    def get_captions(self, kind=None):
+        """
+        Get figure and table captions
+
+        Args:
+            kind: "figure" or "table"; both when None
+
+        Returns:
+            List of caption dictionaries (id, kind, label, page, bbox, text)
+        """
+        captions = self.get_structure().get("captions", [])
+        return [caption for caption in captions if kind is None or caption["kind"] == kind]
+
+    def get_tables(self):
+        """
+        Get tables detected on pages with a table caption
+
+        Returns:
+            List of table dictionaries (id, page, bbox, caption_id, rows)
+        """
+        return self.get_structure().get("tables", [])
+
+    def get_references(self):
+        """
+        Get the reference list entries
+
+        Returns:
+            List of reference strings
+        """
+        return self.get_structure().get("references", [])
+
     def _load_retrieval_json(self, json_path):
         """
         Helper function to load a retrieval JSON file
@@ -118,6 +286,62 @@ class BaseDataset():
             print(f"Error loading retrieval file {json_path}: {str(e)}")
             return None
     
+    def _resolve_page_paths(self, data, key):
+        """
+        Resolve retrieved page names to lazily rendered page images at
+        retrieval_image_profile. full_paths are recorded where retrieval ran,
+        which may be a job workspace that has since been moved, so they are
+        only a fallback. With use_figures, a page with extracted figures is
+        replaced by its figure crops.
+        """
+        page_names = data.get(key)
+        if not page_names:
+            return data.get("full_paths", [])
+        page_nums = [page_num_from_name(name) for name in page_names]
+        figures = self.get_figures() if self.use_figures else []
+        pages = []
+        for page_num in page_nums:
+            if page_num is None:
+                continue
+            crops = [figure["path"] for figure in figures if figure["page"] == page_num]
+            pages.extend(crops or [(page_num, self.retrieval_image_profile)])
+        return LazyPageImages(self, pages)
+    
+    def get_figures(self):
+        """
+        Get the figures extracted with extract_paper --figures
+        
+        Returns:
+            List of figure dictionaries (see scripts/figures.py) with an added
+            "path", or an empty list if figures were not extracted
+        """
+        if not os.path.exists(self.figures_file):
+            return []
+        with open(self.figures_file, 'r', encoding='utf-8') as f:
+            figures = json.load(f).get("figures", [])
+        for figure in figures:
+            figure["path"] = os.path.join(self.paper_folder, figure["file"])
+        return figures
+    
+    def get_page_scores(self):
+        """
+        Get the ColPali score of every page, the highest over the special queries
+        
+        Returns:
+            Dictionary of page number to score; empty if retrieval did not record
+            page scores
+        """
+        scores = {}
+        for json_path in (self.model_structure_file, self.experiment_results_file):
+            if not os.path.exists(json_path):
+                continue
+            data = self._load_retrieval_json(json_path) or {}
+            for name, score in data.get("page_scores", {}).items():
+                page_num = page_num_from_name(name)
+                if page_num is not None:
+                    scores[page_num] = max(score, scores.get(page_num, score))
+        return scores
+    
     def get_model_structure_images(self):
         """
         Get paths to model structure images from retrieval data
@@ -130,7 +354,7 @@ class BaseDataset():
         if not data:
             return []
             
-        return data.get("full_paths", [])
+        return self._resolve_page_paths(data, "model_structure_pages")
     
     def get_experiment_results_images(self):
         """
@@ -144,7 +368,7 @@ class BaseDataset():
         if not data:
             return []
             
-        return data.get("full_paths", [])
+        return self._resolve_page_paths(data, "experiment_results_pages")
     
     def get_retrival_images(self):
         """
@@ -0,0 +1,160 @@
+"""
+Lazy page images.
+
+Pages are rasterized from the paper's PDF the first time a consumer reads them
+at a given render profile, and the PNG is kept on disk under the paper folder
+(<profile dir>/NN_page.<ext>). Files rendered this way are tracked in a
+process-wide LRU with a byte budget, so papers with many pages nobody looks at
+stop paying for them, and the cache cannot grow without bound. The PDFs
+being rendered are kept open (up to MAX_OPEN_DOCUMENTS), so rasterizing a
+long document page by page opens and parses it once, and FITZ_LOCK is only
+held while a page is rendered. Profiles packed into pages.bin are written
+out from the store instead of being rendered again, and are tracked the same
+way.
+"""
+
+import os
+import uuid
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple, Union
+
+import fitz  # PyMuPDF
+
+from scripts.render_profiles import FITZ_LOCK, RENDER_PROFILES, page_filename, render_page
+
+# 同时保持打开的 PDF 数量
+MAX_OPEN_DOCUMENTS = 8
+
+
+class PageImageCache:
+    """
+    Args:
+        max_bytes: Byte budget for lazily rendered page images
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        # (pdf_path, mtime) -> 打开的文档，只在持有 FITZ_LOCK 时访问
+        self._documents: "OrderedDict[Tuple[str, int], fitz.Document]" = OrderedDict()
+
+    def get(
+        self,
+        pdf_path: str,
+        paper_folder: str,
+        page_num: int,
+        profile_name: str,
+        codec: str = "png",
+        quality: Optional[int] = None,
+    ) -> str:
+        """Path of the page image, rendering it first if needed"""
+        image_path = os.path.join(paper_folder, RENDER_PROFILES[profile_name]["dir"], page_filename(page_num, codec))
+        if os.path.exists(image_path):
+            self._track(image_path)
+            return image_path
+
+        os.makedirs(os.path.dirname(image_path), exist_ok=True)
+        # render under a temporary name so readers never see a partial image
+        tmp_path = f"{image_path}.{uuid.uuid4().hex}.tmp"
+        rendered = False
+        with FITZ_LOCK:
+            # another thread may have rendered it while we waited
+            if not os.path.exists(image_path):
+                render_page(
+                    self._document(pdf_path)[page_num - 1], page_num, paper_folder, profile_name,
+                    image_path=tmp_path, codec=codec, quality=quality
+                )
+                rendered = True
+        if rendered:
+            os.replace(tmp_path, image_path)
+        self._track(image_path)
+        return image_path
+
+    def get_packed(self, data: memoryview, paper_folder: str, profile_name: str, image_name: str) -> str:
+        """Path of a page image packed into pages.bin, writing its bytes out first if needed"""
+        image_path = os.path.join(paper_folder, RENDER_PROFILES[profile_name]["dir"], image_name)
+        if not os.path.exists(image_path):
+            os.makedirs(os.path.dirname(image_path), exist_ok=True)
+            tmp_path = f"{image_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, image_path)
+        self._track(image_path)
+        return image_path
+
+    def _document(self, pdf_path: str) -> "fitz.Document":
+        """Open document for pdf_path, reused across pages. Caller holds FITZ_LOCK"""
+        key = (pdf_path, os.stat(pdf_path).st_mtime_ns)
+        pdf_document = self._documents.pop(key, None)
+        if pdf_document is None:
+            pdf_document = fitz.open(pdf_path)
+        self._documents[key] = pdf_document
+        while len(self._documents) > MAX_OPEN_DOCUMENTS:
+            _, old_document = self._documents.popitem(last=False)
+            old_document.close()
+        return pdf_document
+
+    def _track(self, image_path: str) -> None:
+        try:
+            size = os.path.getsize(image_path)
+        except OSError:
+            return
+        evicted = []
+        with self._lock:
+            self._total -= self._entries.pop(image_path, 0)
+            self._entries[image_path] = size
+            self._total += size
+            # least recently used first, never the image just requested
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                path, old_size = self._entries.popitem(last=False)
+                self._total -= old_size
+                evicted.append(path)
+        for path in evicted:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+page_image_cache = PageImageCache(int(os.environ.get("PAGE_IMAGE_CACHE_MB", "2048")) * 1024 * 1024)
+
+
+class LazyPageImages(Sequence):
+    """
+    List of page image paths that renders each page when it is read. Taking
+    len() or passing it around does not render anything, so agents that drop
+    images never trigger rasterization. Entries are (page_num, profile_name),
+    or the path of an image that already exists, such as a figure crop.
+    """
+
+    def __init__(self, dataset, pages: List[Union[Tuple[int, str], str]]):
+        self.dataset = dataset
+        self.pages = list(pages)
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return LazyPageImages(self.dataset, self.pages[idx])
+        item = self.pages[idx]
+        if isinstance(item, str):
+            return item
+        page_num, profile_name = item
+        return self.dataset.page_image(page_num, profile_name)
+
+    def __add__(self, other):
+        if isinstance(other, LazyPageImages) and other.dataset is self.dataset:
+            return LazyPageImages(self.dataset, self.pages + other.pages)
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        if len(other) == 0:
+            return self
+        return list(other) + list(self)
+
+    def __repr__(self) -> str:
+        return f"LazyPageImages({self.dataset.paper_name}, {self.pages})"
@@ -0,0 +1,127 @@
+"""
+Page budget planner for long documents.
+
+Extraction keeps every page, but a survey or thesis does not fit in a VLM
+context as page images. Given a token budget, PagePlanner picks the pages
+(as images) and text chunks an agent receives:
+
+    pages: the first page, then the ranked_pages best pages by ColPali
+           retrieval score (page_scores in retrieval/*.json), the pages
+           opening key sections, then the remaining pages in reading order;
+           pages in the references and appendix come last unless retrieval
+           ranked them
+    text:  chunks of the abstract and key sections (introduction, method,
+           experiments, conclusion), then other sections, never references
+
+Image tokens are estimated from the vlm render profile's pixel budget and text
+tokens from the character count, so the plan is a conservative upper bound.
+"""
+
+from typing import List, NamedTuple, Optional
+
+from scripts.render_profiles import RENDER_PROFILES
+from scripts.layout import REFERENCE_SECTIONS
+
+# Qwen2-VL / GPT-4o 按 28x28 patch 计费的上限
+IMAGE_TOKENS_PER_PAGE = RENDER_PROFILES["vlm"]["max_pixels"] // (28 * 28)
+CHARS_PER_TOKEN = 4
+DEFAULT_CHUNK_CHARS = 4000
+# 与检索结果数相当: 两个特殊查询各取 top_k=3
+RANKED_PAGES = 6
+
+KEY_SECTIONS = ("abstract", "introduction", "method", "approach", "model", "architecture",
+                "experiment", "result", "evaluation", "conclusion")
+TAIL_SECTIONS = tuple(REFERENCE_SECTIONS) + ("appendix", "supplementary")
+
+
+class PagePlan(NamedTuple):
+    pages: List[int]  # page numbers in reading order
+    texts: List[str]  # text chunks, each headed by its section title
+    tokens: int       # estimated tokens of pages and texts
+
+
+class PagePlanner:
+    """
+    Args:
+        dataset: BaseDataset of the paper
+        image_tokens_per_page: Estimated tokens for one page image
+        chunk_chars: Maximum characters per text chunk
+        ranked_pages: Pages taken by retrieval score before section structure
+    """
+
+    def __init__(self, dataset, image_tokens_per_page: int = IMAGE_TOKENS_PER_PAGE, chunk_chars: Optional[int] = None,
+                 ranked_pages: int = RANKED_PAGES):
+        self.dataset = dataset
+        self.ranked_pages = ranked_pages
+        self.image_tokens_per_page = image_tokens_per_page
+        self.chunk_chars = chunk_chars or dataset.max_character_per_page or DEFAULT_CHUNK_CHARS
+        self.page_nums = [page["page_num"] for page in dataset.content.get("pages", [])]
+        self.sections = dataset.get_sections()
+
+    def fits(self, token_budget: Optional[int]) -> bool:
+        """Whether every page fits in the budget as an image"""
+        return token_budget is None or len(self.page_nums) * self.image_tokens_per_page <= token_budget
+
+    def _tail_start(self) -> Optional[int]:
+        """First page of the references / appendix"""
+        for section in self.sections:
+            if section["level"] <= 1 and section["title"].lower().lstrip("0123456789. ").startswith(TAIL_SECTIONS):
+                return section["page_start"]
+        return None
+
+    def page_priority(self) -> List[int]:
+        """All page numbers, most useful first"""
+        scores = self.dataset.get_page_scores()
+        tail_start = self._tail_start()
+        # page_scores 覆盖每一页，只取得分最高的几页，其余按章节结构排序
+        ranked = sorted(scores, key=lambda page_num: -scores[page_num])[:self.ranked_pages]
+        key_pages = [
+            section["page_start"] for section in self.sections
+            if any(name in section["title"].lower() for name in KEY_SECTIONS)
+        ]
+        body = [page_num for page_num in self.page_nums if tail_start is None or page_num < tail_start]
+        tail = [page_num for page_num in self.page_nums if page_num not in body]
+
+        order: List[int] = []
+        for page_num in self.page_nums[:1] + ranked + key_pages + body + tail:
+            if page_num in self.page_nums and page_num not in order:
+                order.append(page_num)
+        return order
+
+    def text_chunks(self) -> List[str]:
+        """Section text split into chunks, most useful first"""
+        key, other = [], []
+        abstract = self.dataset.get_abstract()
+        if abstract:
+            key.append(f"Abstract\n{abstract}")
+        for section in self.sections:
+            title = section["title"].lower()
+            if not section["text"] or title == "abstract" or title.lstrip("0123456789. ").startswith(TAIL_SECTIONS):
+                continue
+            text = section["text"]
+            chunks = [
+                f"{section['title'] or 'Front matter'} (p. {section['page_start']})\n{text[start:start + self.chunk_chars]}"
+                for start in range(0, len(text), self.chunk_chars)
+            ]
+            (key if any(name in title for name in KEY_SECTIONS) else other).extend(chunks)
+        return key + other
+
+    def plan(self, token_budget: int, use_text: bool = False, text_share: float = 0.3) -> PagePlan:
+        """
+        Pick pages, and text chunks when use_text, within token_budget.
+        text_share is the part of the budget reserved for text.
+        """
+        texts: List[str] = []
+        text_tokens = 0
+        if use_text:
+            text_budget = int(token_budget * text_share)
+            for chunk in self.text_chunks():
+                tokens = len(chunk) // CHARS_PER_TOKEN + 1
+                if text_tokens + tokens > text_budget:
+                    continue
+                texts.append(chunk)
+                text_tokens += tokens
+
+        max_pages = max(1, (token_budget - text_tokens) // self.image_tokens_per_page)
+        pages = sorted(self.page_priority()[:max_pages])
+        return PagePlan(pages, texts, text_tokens + len(pages) * self.image_tokens_per_page)
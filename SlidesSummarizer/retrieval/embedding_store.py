@@ -0,0 +1,158 @@
+"""
+Persistent ColPali page embeddings.
+
+Each paper keeps the multi-vector embeddings of its page images under
+<paper_dir>/embeddings/:
+
+    shard-<id>.npy  float16 [tokens, dim], the pages of one put_many call
+                    one after another
+    index.json      {"format", "model_version", "dim",
+                     "entries": {image key: [shard, offset, tokens]}}
+
+Entries are keyed by a hash of the decoded page image (image_key), so a page
+re-rendered at another size or codec gets a new entry, and by the model
+version, so a different checkpoint, adapter or precision starts a new store.
+New pages go into a new shard and only the small index is rewritten, so
+adding pages costs I/O for the new pages only; existing shards are never
+modified. Rerunning retrieval with other queries or top_k then only encodes
+the queries.
+"""
+
+import os
+import json
+import uuid
+import hashlib
+import threading
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+EMBEDDINGS_DIR = "embeddings"
+STORE_FORMAT = 2
+
+# 同一进程内对同一存储的追加需串行
+_STORE_LOCK = threading.Lock()
+
+
+def image_key(image) -> str:
+    """Hash of a PIL image's mode, size and pixels"""
+    digest = hashlib.sha256(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Args:
+        root: Store directory, <paper_dir>/embeddings
+        model_version: Identifies the model that produced the embeddings
+    """
+
+    def __init__(self, root: str, model_version: str):
+        self.root = root
+        self.model_version = model_version
+        self.index_path = os.path.join(root, "index.json")
+        self.entries: Dict[str, list] = {}
+        self.dim: Optional[int] = None
+        self._shards: Dict[str, np.ndarray] = {}
+        self._stale = False
+        self._load()
+
+    def _load(self) -> None:
+        """Read index.json into entries; sets _stale when it cannot be used"""
+        self.entries, self.dim, self._stale = {}, None, False
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Ignoring unreadable embedding index {self.index_path}: {e}")
+            self._stale = True
+            return
+        if index.get("format") != STORE_FORMAT or index.get("model_version") != self.model_version:
+            # 模型或精度变了，旧嵌入不可用，下次写入时整体替换
+            self._stale = True
+            return
+        self.entries = index.get("entries", {})
+        self.dim = index.get("dim")
+
+    def _shard(self, name: str) -> np.ndarray:
+        if name not in self._shards:
+            self._shards[name] = np.load(os.path.join(self.root, name), mmap_mode="r")
+        return self._shards[name]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        shard, offset, length = entry
+        try:
+            return self._shard(shard)[offset:offset + length]
+        except OSError:
+            return None
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def _remove_stale(self) -> None:
+        """Drop the shards of an index written for another model version"""
+        for name in os.listdir(self.root):
+            # embeddings.npy 为单文件的旧格式
+            if name == "embeddings.npy" or (name.startswith("shard-") and name.endswith(".npy")):
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except OSError:
+                    pass
+        self._stale = False
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        """Write embeddings ([tokens, dim] each) for keys not stored yet as one new shard"""
+        items = {key: value for key, value in items.items() if key not in self.entries}
+        if not items:
+            return
+        with _STORE_LOCK:
+            # 其他实例 (如 LibraryRetrieval 持有的存储) 可能已写入新条目，
+            # 以磁盘上的索引为准合并，不覆盖它们
+            self._load()
+            items = {key: value for key, value in items.items() if key not in self.entries}
+            if not items:
+                return
+            os.makedirs(self.root, exist_ok=True)
+            if self._stale:
+                self._remove_stale()
+            shard = f"shard-{uuid.uuid4().hex}.npy"
+            entries = dict(self.entries)
+            blocks = []
+            offset = 0
+            for key, value in items.items():
+                value = np.asarray(value, dtype=np.float16)
+                entries[key] = [shard, offset, int(value.shape[0])]
+                offset += value.shape[0]
+                blocks.append(value)
+            data = np.concatenate(blocks, axis=0)
+
+            # 先写分片再替换索引，读者不会看到指向不存在分片的条目
+            tmp_data = os.path.join(self.root, f"{shard}.tmp.npy")
+            np.save(tmp_data, data)
+            os.replace(tmp_data, os.path.join(self.root, shard))
+            tmp_index = f"{self.index_path}.tmp"
+            with open(tmp_index, "w", encoding="utf-8") as f:
+                json.dump({
+                    "format": STORE_FORMAT,
+                    "model_version": self.model_version,
+                    "dim": int(data.shape[1]),
+                    "entries": entries,
+                }, f)
+            os.replace(tmp_index, self.index_path)
+
+            self.entries = entries
+            self.dim = int(data.shape[1])
@@ -1,11 +1,12 @@
+import numpy as np
 import torch
 from torch.utils.data import DataLoader
 from PIL import Image
 from tqdm import tqdm
 import os
 import pickle
+import time
 from colpali_engine.models.paligemma_colbert_architecture import ColPali
-from colpali_engine.trainer.retrieval_evaluator import CustomEvaluator
 from colpali_engine.utils.colpali_processing_utils import process_images, process_queries
 from transformers import AutoProcessor
 
@@ -13,21 +14,74 @@ import json
 from pathlib import Path
 import argparse
 
+from retrieval.embedding_store import EMBEDDINGS_DIR, EmbeddingStore, image_key
+from retrieval.maxsim import maxsim_scores
+from scripts.page_store import PageStore, page_store_path
+
 # Import models directory
 os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 
+# 推理精度: int8 为 CPU 上的动态量化
+PRECISIONS = ("fp32", "bf16", "int8")
+
+class PageIndex:
+    """
+    一篇论文所有页面的多向量嵌入, 建好后可以回答任意数量的查询
+    
+    Args:
+        embeddings: 页面嵌入, 形状为 [pages, tokens, dim]
+        image_paths: 与嵌入一一对应的页面图像路径
+    """
+    
+    def __init__(self, embeddings, image_paths):
+        self.embeddings = embeddings
+        self.image_paths = list(image_paths)
+        self.page_names = [Path(p).name for p in self.image_paths]
+    
+    def __len__(self):
+        return len(self.image_paths)
+
 class ImageRetrieval:
     """基于视觉语言模型的论文图像检索系统"""
     
-    def __init__(self):
-        """初始化图像检索系统"""
+    # 所需的页面渲染尺寸 (见 scripts/render_profiles.py)
+    render_profile = "retrieval"
+    
+    def __init__(self, device_map="auto", batch_size=None, persist_embeddings=True, precision=None):
+        """
+        初始化图像检索系统
+        
+        Args:
+            device_map: 模型加载的设备, "auto" 或 "cpu" / "cuda" 等
+            batch_size: 每批嵌入的页面数; 默认取环境变量 COLPALI_BATCH_SIZE,
+                未设置时按设备和空闲显存自动选择。显存不足时自动减半
+            persist_embeddings: 页面嵌入保存到论文目录的 embeddings/ (见
+                retrieval/embedding_store.py)，重新检索时复用
+            precision: 推理精度, PRECISIONS 之一; 默认取环境变量 COLPALI_PRECISION
+                (fp32)。bf16 权重和激活减半; int8 把 Linear 权重量化为 int8，
+                只能在 CPU 上运行
+        """
         # 初始化视觉语言模型
         model_name = "vidore/colpali"
-        print(f"Loading model: {model_name}")
-        
-        self.model = ColPali.from_pretrained("vidore/colpaligemma-3b-mix-448-base", torch_dtype=torch.float32, device_map="auto").eval()
+        base_model_name = "vidore/colpaligemma-3b-mix-448-base"
+        self.precision = precision or os.environ.get("COLPALI_PRECISION", "fp32")
+        if self.precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision {self.precision}, expected one of {', '.join(PRECISIONS)}")
+        if self.precision == "int8" and device_map != "cpu":
+            print(f"[WARN] int8 dynamic quantization only runs on CPU, loading on cpu instead of {device_map}")
+            device_map = "cpu"
+        print(f"Loading model: {model_name} ({self.precision})")
+        
+        torch_dtype = torch.bfloat16 if self.precision == "bf16" else torch.float32
+        self.model = ColPali.from_pretrained(base_model_name, torch_dtype=torch_dtype, device_map=device_map).eval()
         self.model.load_adapter(model_name)
+        if self.precision == "int8":
+            self.quantize_int8()
         self.processor = AutoProcessor.from_pretrained(model_name)
+        self.batch_size = batch_size or int(os.environ.get("COLPALI_BATCH_SIZE", "0")) or self.auto_batch_size()
+        # 存储的嵌入只对产生它们的模型有效
+        self.model_version = f"{base_model_name}+{model_name}:{self.precision}"
+        self.persist_embeddings = persist_embeddings
         
         # 预定义特殊查询
         self.special_queries = {
@@ -35,14 +89,18 @@ class ImageRetrieval:
             "experiment_results": "Find experimental results, data tables, performance charts, evaluation metrics, or comparison graphs"
         }
         
-        print("Model initialized successfully")
+        print(f"Model initialized successfully (batch size {self.batch_size})")
     
     def load_images(self, image_dir):
-        """加载目录中的所有图像"""
+        """加载目录中的所有图像; 图像已打包进论文目录的 pages.bin 时从中读取"""
+        store_path = page_store_path(os.path.dirname(image_dir))
+        if not os.path.isdir(image_dir) and os.path.exists(store_path):
+            return self.load_page_store(store_path, image_dir)
+        
         print(f"Loading images from {image_dir}")
         images = []
         image_paths = []
-        valid_extensions = ['.jpg', '.jpeg', '.png', '.bmp']
+        valid_extensions = ['.jpg', '.jpeg', '.png', '.webp', '.bmp']
         
         # 按文件名中的数字排序
         files = sorted(os.listdir(image_dir), 
@@ -61,148 +119,323 @@ class ImageRetrieval:
         print(f"Loaded {len(images)} images")
         return images, image_paths
     
-    def embed_images(self, images):
-        """生成图像嵌入"""
+    def load_page_store(self, store_path, image_dir):
+        """从 pages.bin 加载 render_profile 的页面图像, 路径按打包前的文件名给出"""
+        print(f"Loading images from {store_path}")
+        images = []
+        image_paths = []
+        with PageStore(store_path) as store:
+            for page_num in store.page_nums():
+                img = store.open_image(page_num, self.render_profile)
+                if img is None:
+                    continue
+                images.append(img.convert('RGB'))
+                image_paths.append(os.path.join(image_dir, store.image_name(page_num, self.render_profile)))
+        
+        print(f"Loaded {len(images)} images")
+        return images, image_paths
+    
+    def quantize_int8(self):
+        """
+        动态量化: Linear 权重存为 int8, 激活在运行时逐批量化。LoRA 适配器的
+        Linear 保持浮点 (peft 在前向中读取它们的 weight)
+        """
+        linear_names = {
+            name for name, module in self.model.named_modules()
+            if isinstance(module, torch.nn.Linear) and "lora_" not in name
+        }
+        # inplace 避免复制整个 3B 模型
+        torch.ao.quantization.quantize_dynamic(self.model, linear_names, dtype=torch.qint8, inplace=True)
+        print(f"Quantized {len(linear_names)} linear layers to int8")
+    
+    def auto_batch_size(self):
+        """按设备选择批大小: GPU 上按空闲显存估算 (每页约 256 MB 激活), CPU 上取 4"""
+        device = self.model.device
+        if device.type == "cuda":
+            free_bytes, _ = torch.cuda.mem_get_info(device)
+            return max(1, min(32, free_bytes // (256 * 1024 * 1024)))
+        return 4
+    
+    @staticmethod
+    def _is_oom(error):
+        """显存或内存不足 (CUDA、MPS 和 CPU 分配器的报错)"""
+        if isinstance(error, (MemoryError, torch.cuda.OutOfMemoryError)):
+            return True
+        message = str(error).lower()
+        return "out of memory" in message or "can't allocate memory" in message
+    
+    def _embed_batch(self, images):
+        """一批图像的嵌入, 形状为 [batch, tokens, dim]"""
+        batch = process_images(self.processor, images)
+        if self.model.device.type == "cuda":
+            # 锁页内存 + 异步拷贝到显存
+            batch = {key: value.pin_memory().to(self.model.device, non_blocking=True) for key, value in batch.items()}
+        else:
+            batch = batch.to(self.model.device)
+        with torch.no_grad():
+            return self.model(**batch)
+    
+    def embed_batch(self, images):
+        """
+        嵌入一批图像; 显存不足时把 batch_size 减半并拆成两半重试, 之后的批次
+        沿用减小后的 batch_size
+        """
+        try:
+            return self._embed_batch(images)
+        except (RuntimeError, MemoryError) as e:
+            if not self._is_oom(e) or len(images) == 1:
+                raise
+        if self.model.device.type == "cuda":
+            torch.cuda.empty_cache()
+        half = len(images) // 2
+        self.batch_size = max(1, min(self.batch_size, half))
+        print(f"[WARN] Out of memory embedding {len(images)} pages, batch size reduced to {self.batch_size}")
+        return torch.cat([self.embed_batch(images[:half]), self.embed_batch(images[half:])], dim=0)
+    
+    def embed_image(self, img):
+        """生成单张图像的嵌入"""
+        return self.embed_batch([img])[0]
+    
+    def embed_cached(self, images, store=None):
+        """
+        嵌入一批图像; 给定 store (EmbeddingStore) 时已存储的页面直接读取
+        
+        Returns:
+            (嵌入列表, 每页是否来自 store, 新嵌入的 {image_key: float16 数组})，
+            新嵌入由调用方写回 store
+        """
+        if store is None:
+            return list(self.embed_batch(images)), [False] * len(images), {}
+        keys = [image_key(img) for img in images]
+        stored = store.get_many(keys)
+        embeddings = [
+            torch.from_numpy(np.asarray(stored[key], dtype=np.float32)).to(self.model.device, self.model.dtype)
+            if key in stored else None
+            for key in keys
+        ]
+        missing = [idx for idx, key in enumerate(keys) if key not in stored]
+        new = {}
+        if missing:
+            for idx, embedding in zip(missing, self.embed_batch([images[idx] for idx in missing])):
+                embeddings[idx] = embedding
+                new[keys[idx]] = embedding.float().cpu().numpy().astype(np.float16)
+        return embeddings, [key in stored for key in keys], new
+    
+    def embedding_store(self, paper_dir):
+        """论文目录下的嵌入存储 (见 retrieval/embedding_store.py)"""
+        return EmbeddingStore(os.path.join(paper_dir, EMBEDDINGS_DIR), self.model_version)
+    
+    def embed_images(self, images, progress_callback=None, store=None):
+        """
+        生成图像嵌入, progress_callback(event, data) 在每页完成后调用。给定 store
+        时已存储的页面不再嵌入 (embed_page 事件带 cached)，新页面嵌入后写入 store
+        """
         print("Generating image embeddings...")
         image_embeddings = []
-        
-        # 处理每个图像
-        for img in tqdm(images):
-            processed_img = process_images(self.processor, [img]).to(self.model.device)
-            with torch.no_grad():
-                embedding = self.model(**processed_img)
-                image_embeddings.append(embedding[0])  # 取第一个嵌入（批次大小为1）
-        
+        new_embeddings = {}
+        
+        # 按 batch_size 分批处理 (OOM 后 batch_size 可能变小)
+        with tqdm(total=len(images)) as progress:
+            start = 0
+            while start < len(images):
+                batch = images[start:start + self.batch_size]
+                batch_start = time.time()
+                embeddings, cached, new = self.embed_cached(batch, store)
+                seconds = (time.time() - batch_start) / len(batch)
+                image_embeddings.extend(embeddings)
+                new_embeddings.update(new)
+                if progress_callback:
+                    for offset in range(len(batch)):
+                        progress_callback("embed_page", {
+                            "page": start + offset + 1,
+                            "num_pages": len(images),
+                            "seconds": seconds,
+                            "cached": cached[offset]
+                        })
+                start += len(batch)
+                progress.update(len(batch))
+        
+        if store is not None:
+            print(f"Reused {len(images) - len(new_embeddings)} stored page embeddings")
+            store.put_many(new_embeddings)
         return torch.stack(image_embeddings, dim=0)
     
-    def query_images(self, query_text, image_embeddings, top_k=3):
-        """根据查询文本检索图像"""
-        print(f"Querying with: '{query_text}'")
-        
-        # 处理查询
-        query = [query_text]
+    def embed_stream(self, records, progress_callback=None, store=None):
+        """
+        边抽取边嵌入: records 是 scripts/extract_paper.py 中 stream_paper 产生的
+        PageRecord，每到达一页就立即嵌入，不等整篇论文渲染完成。store 的用法同
+        embed_images。
+
+        Returns:
+            (image_embeddings, image_paths)，按页码排序；没有页面时为 (None, [])
+        """
+        print("Generating image embeddings from page stream...")
+        pages = []
+        pending = []
+        new_embeddings = {}
+        
+        def flush():
+            batch_start = time.time()
+            images = [
+                record.image if record.image is not None else Image.open(record.image_path).convert('RGB')
+                for record in pending
+            ]
+            embeddings, cached, new = self.embed_cached(images, store)
+            new_embeddings.update(new)
+            seconds = (time.time() - batch_start) / len(pending)
+            for record, embedding, from_store in zip(pending, embeddings, cached):
+                pages.append((record.page_num, record.image_path, embedding))
+                if progress_callback:
+                    progress_callback("embed_page", {
+                        "page": record.page_num,
+                        "num_pages": record.num_pages,
+                        "seconds": seconds,
+                        "cached": from_store
+                    })
+            pending.clear()
+        
+        # 攒满一批即嵌入
+        for record in records:
+            if record.image_path is None:
+                continue
+            pending.append(record)
+            if len(pending) >= self.batch_size:
+                flush()
+        if pending:
+            flush()
+        
+        if store is not None:
+            store.put_many(new_embeddings)
+        if not pages:
+            return None, []
+        # 多进程渲染时页面按完成顺序到达
+        pages.sort(key=lambda page: page[0])
+        return torch.stack([page[2] for page in pages], dim=0), [page[1] for page in pages]
+    
+    def build_index(self, image_dir, progress_callback=None):
+        """
+        加载并嵌入目录中的所有页面, 每篇论文只需嵌入一次。persist_embeddings 时
+        嵌入保存在论文目录的 embeddings/ 下，再次检索只需编码查询
+        """
+        images, image_paths = self.load_images(image_dir)
+        if not images:
+            return PageIndex(None, [])
+        store = self.embedding_store(os.path.dirname(image_dir)) if self.persist_embeddings else None
+        return PageIndex(self.embed_images(images, progress_callback, store), image_paths)
+    
+    def embed_queries(self, query_texts):
+        """一次前向传播嵌入多个查询, 形状为 [queries, tokens, dim] (填充位置的向量为零)"""
         batch_queries = process_queries(
             self.processor, 
-            query, 
+            list(query_texts), 
             Image.new("RGB", (448, 448), (255, 255, 255))
         ).to(self.model.device)
-        
-        # 生成查询嵌入
         with torch.no_grad():
-            query_embedding = self.model(**batch_queries)
-        
-        # 计算相似度并排序
-        evaluator = CustomEvaluator(is_multi_vector=True)
-        scores = evaluator.evaluate(query_embedding, image_embeddings)
+            return self.model(**batch_queries)
+    
+    def score_queries(self, query_texts, image_embeddings):
+        """所有查询对所有页面的得分, 形状为 [queries, pages], 留在页面嵌入所在的设备上"""
+        query_embeddings = self.embed_queries(query_texts)
+        return maxsim_scores(query_embeddings, image_embeddings)
+    
+    def query_images(self, query_text, image_embeddings, top_k=3, return_all_scores=False):
+        """根据查询文本检索图像; return_all_scores 时还返回所有页面的得分 (供页面预算规划使用)"""
+        print(f"Querying with: '{query_text}'")
+        scores_tensor = self.score_queries([query_text], image_embeddings)
         
         # 获取top-k结果
-        scores_tensor = torch.tensor(scores)
         top_results = torch.topk(scores_tensor, min(top_k, scores_tensor.shape[1]), dim=-1)
         
         top_indices = top_results.indices.tolist()[0]
         top_scores = top_results.values.tolist()[0]
         
+        if return_all_scores:
+            return top_indices, top_scores, scores_tensor[0].tolist()
         return top_indices, top_scores
     
-    def find_model_structure_pages(self, image_dir, output_dir=None, top_k=3):
-        """检索包含模型结构的页面"""
-        # 加载图像
-        images, image_paths = self.load_images(image_dir)
-        if not images:
+    def answer_queries(self, index, queries, top_k=3, output_dir=None):
+        """
+        在页面索引上一次批量回答多个查询
+        
+        Args:
+            index: build_index / embed_stream 得到的 PageIndex
+            queries: 查询名到查询文本的字典, 如 self.special_queries
+            top_k: 每个查询返回的页面数
+            output_dir: 给定时每个查询的结果保存为 <name>_pages.json
+            
+        Returns:
+            查询名到结果字典 (query, <name>_pages, scores, full_paths, page_scores) 的字典
+        """
+        if not len(index):
             print("No images found")
-            return []
-        
-        # 生成嵌入
-        image_embeddings = self.embed_images(images)
-        
-        # 用于找模型结构的查询
-        query = self.special_queries["model_structure"]
-        top_indices, top_scores = self.query_images(query, image_embeddings, top_k)
-        
-        # 获取结果路径
-        result_paths = [image_paths[i] for i in top_indices]
-        
-        # 保存结果
-        results = {
-            "query": query,
-            "model_structure_pages": [Path(p).name for p in result_paths],
-            "scores": top_scores,
-            "full_paths": result_paths
-        }
+            return {name: [] for name in queries}
         
-        if output_dir:
-            os.makedirs(output_dir, exist_ok=True)
-            output_path = os.path.join(output_dir, "model_structure_pages.json")
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(results, f, ensure_ascii=False, indent=2)
-            print(f"Model structure pages saved to {output_path}")
+        names = list(queries)
+        print(f"Querying {len(names)} queries against {len(index)} pages")
+        scores_tensor = self.score_queries([queries[name] for name in names], index.embeddings)
+        top_results = torch.topk(scores_tensor, min(top_k, scores_tensor.shape[1]), dim=-1)
         
-        # 打印结果
-        print("\nModel Structure Pages:")
-        for i, (idx, score) in enumerate(zip(top_indices, top_scores)):
-            print(f"{i+1}. {Path(image_paths[idx]).name} (Score: {score:.4f})")
+        results = {}
+        for row, name in enumerate(names):
+            top_indices = top_results.indices[row].tolist()
+            top_scores = top_results.values[row].tolist()
+            result_paths = [index.image_paths[i] for i in top_indices]
+            results[name] = {
+                "query": queries[name],
+                f"{name}_pages": [Path(p).name for p in result_paths],
+                "scores": top_scores,
+                "full_paths": result_paths,
+                "page_scores": dict(zip(index.page_names, scores_tensor[row].tolist()))
+            }
+            
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+                output_path = os.path.join(output_dir, f"{name}_pages.json")
+                with open(output_path, 'w', encoding='utf-8') as f:
+                    json.dump(results[name], f, ensure_ascii=False, indent=2)
+                print(f"{name} pages saved to {output_path}")
+            
+            # 打印结果
+            print(f"\n{name} pages:")
+            for i, (idx, score) in enumerate(zip(top_indices, top_scores)):
+                print(f"{i+1}. {index.page_names[idx]} (Score: {score:.4f})")
         
         return results
     
-    def find_experiment_results_pages(self, image_dir, output_dir=None, top_k=3):
+    def _index_for(self, image_dir, progress_callback, image_embeddings, image_paths):
+        # 已有嵌入 (如 embed_stream 的结果) 时直接使用; embed_stream 没有页面时
+        # 返回 (None, [])，此时为空索引，不再去加载 (可能不存在的) image_dir
+        if image_embeddings is not None or image_paths is not None:
+            return PageIndex(image_embeddings, image_paths or [])
+        return self.build_index(image_dir, progress_callback)
+    
+    def find_model_structure_pages(self, image_dir, output_dir=None, top_k=3, progress_callback=None,
+                                   image_embeddings=None, image_paths=None):
+        """检索包含模型结构的页面"""
+        index = self._index_for(image_dir, progress_callback, image_embeddings, image_paths)
+        queries = {"model_structure": self.special_queries["model_structure"]}
+        return self.answer_queries(index, queries, top_k, output_dir)["model_structure"]
+    
+    def find_experiment_results_pages(self, image_dir, output_dir=None, top_k=3, progress_callback=None,
+                                      image_embeddings=None, image_paths=None):
         """检索包含实验结果的页面"""
-        # 加载图像
-        images, image_paths = self.load_images(image_dir)
-        if not images:
-            print("No images found")
-            return []
-        
-        # 生成嵌入
-        image_embeddings = self.embed_images(images)
-        
-        # 用于找实验结果的查询
-        query = self.special_queries["experiment_results"]
-        top_indices, top_scores = self.query_images(query, image_embeddings, top_k)
-        
-        # 获取结果路径
-        result_paths = [image_paths[i] for i in top_indices]
-        
-        # 保存结果
-        results = {
-            "query": query,
-            "experiment_results_pages": [Path(p).name for p in result_paths],
-            "scores": top_scores,
-            "full_paths": result_paths
-        }
-        
-        if output_dir:
-            os.makedirs(output_dir, exist_ok=True)
-            output_path = os.path.join(output_dir, "experiment_results_pages.json")
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(results, f, ensure_ascii=False, indent=2)
-            print(f"Experiment results pages saved to {output_path}")
-        
-        # 打印结果
-        print("\nExperiment Results Pages:")
-        for i, (idx, score) in enumerate(zip(top_indices, top_scores)):
-            print(f"{i+1}. {Path(image_paths[idx]).name} (Score: {score:.4f})")
-        
-        return results
+        index = self._index_for(image_dir, progress_callback, image_embeddings, image_paths)
+        queries = {"experiment_results": self.special_queries["experiment_results"]}
+        return self.answer_queries(index, queries, top_k, output_dir)["experiment_results"]
     
-    def find_specialized_pages(self, image_dir, output_dir=None, top_k=3):
-        """检索模型结构和实验结果页面"""
+    def find_specialized_pages(self, image_dir, output_dir=None, top_k=3, progress_callback=None,
+                               image_embeddings=None, image_paths=None):
+        """
+        检索 special_queries 中的所有页面类型 (模型结构、实验结果等)。页面只
+        嵌入一次, 所有查询在同一个索引上批量打分。传入 image_embeddings /
+        image_paths 时 (见 embed_stream) 不再从 image_dir 加载图像。
+        """
         # 创建输出目录
         if output_dir:
             os.makedirs(output_dir, exist_ok=True)
         
-        # 检索模型结构页面
-        print("\n=== Finding Model Structure Pages ===")
-        model_results = self.find_model_structure_pages(image_dir, output_dir, top_k)
-        
-        # 检索实验结果页面
-        print("\n=== Finding Experiment Results Pages ===")
-        experiment_results = self.find_experiment_results_pages(image_dir, output_dir, top_k)
-        
-        # 合并结果
-        combined_results = {
-            "model_structure": model_results,
-            "experiment_results": experiment_results
-        }
+        index = self._index_for(image_dir, progress_callback, image_embeddings, image_paths)
+        combined_results = self.answer_queries(index, self.special_queries, top_k, output_dir)
         
         # 保存合并结果
         if output_dir:
@@ -212,4 +445,3 @@ class ImageRetrieval:
             print(f"\nCombined results saved to {output_path}")
         
         return combined_results
-
@@ -0,0 +1,335 @@
+"""
+Visual search over every paper in the data folder.
+
+Each paper's ColPali page embeddings (retrieval/embedding_store.py) are too
+large to scan for every query across a library, so the library keeps a
+compact first-stage index in <data_folder>/.library/:
+
+    pooled.npy   int8 [vectors, dim]  page tokens mean-pooled in groups of
+                                      pool_factor, L2-normalized, quantized
+                                      with one scale per vector
+    scales.npy   float32 [vectors]
+    offsets.npy  int64 [pages + 1]    first pooled vector of each page
+    index.json   model version, pool factor, per-paper signature and pages
+
+A query is scored against the pooled vectors in chunks (approximate
+MaxSim), the best candidate pages are kept, and only those are reranked with
+exact MaxSim over their full embeddings, read through mmap from the paper's
+embedding store. Papers whose page images changed since the last build are
+re-embedded (reusing stored embeddings) and the rest are kept as they are.
+"""
+
+import os
+import json
+import time
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import torch
+
+from retrieval.base_retrieval import BaseRetrieval
+from retrieval.embedding_store import EmbeddingStore, image_key
+from retrieval.maxsim import maxsim_scores
+from mydatasets.base_dataset import BaseDataset
+from scripts.page_store import page_store_path
+from scripts.render_profiles import image_dir_for, page_num_from_name
+
+LIBRARY_DIR = ".library"
+
+# 多个 worker 共用同一个索引目录，同一进程内的更新需串行
+_LIBRARY_LOCK = threading.Lock()
+
+DEFAULT_CONFIG = {
+    "pool_factor": 4,          # page tokens per pooled vector
+    "candidates": 100,         # pages kept for exact reranking (at least top_k * 10)
+    "chunk_vectors": 1 << 16,  # pooled vectors scored at a time
+}
+
+
+def pool_tokens(embedding: np.ndarray, pool_factor: int) -> np.ndarray:
+    """Mean-pool adjacent tokens of a [tokens, dim] page embedding and re-normalize"""
+    embedding = np.asarray(embedding, dtype=np.float32)
+    starts = np.arange(0, embedding.shape[0], pool_factor)
+    counts = np.diff(np.append(starts, embedding.shape[0]))[:, None]
+    pooled = np.add.reduceat(embedding, starts, axis=0) / counts
+    norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+    return pooled / np.maximum(norms, 1e-6)
+
+
+def quantize(vectors: np.ndarray):
+    """Symmetric int8 quantization with one scale per vector"""
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-6) / 127.0
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+class LibraryRetrieval(BaseRetrieval):
+    """
+    Args:
+        retriever: ImageRetrieval used to embed pages and queries
+        data_folder: Folder holding one directory per paper
+        config: Overrides for DEFAULT_CONFIG
+    """
+
+    def __init__(self, retriever, data_folder: str = "data", config: Optional[Dict[str, Any]] = None):
+        super().__init__({**DEFAULT_CONFIG, **(config or {})})
+        self.retriever = retriever
+        self.data_folder = data_folder
+        self.index_dir = os.path.join(data_folder, LIBRARY_DIR)
+        self.pages: List[Dict[str, Any]] = []
+        self.papers: Dict[str, List[int]] = {}
+        self.pooled = np.zeros((0, 0), dtype=np.int8)
+        self.scales = np.zeros(0, dtype=np.float32)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self._stores: Dict[str, EmbeddingStore] = {}
+        self._load()
+
+    # 索引的读写
+
+    def _load(self) -> None:
+        index_path = os.path.join(self.index_dir, "index.json")
+        if not os.path.exists(index_path):
+            return
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("model_version") != self.retriever.model_version or \
+                index.get("pool_factor") != self.config["pool_factor"]:
+            print("[INFO] Library index was built with another model or pool factor, rebuilding")
+            return
+        self.papers = index["papers"]
+        self.pages = index["pages"]
+        self.pooled = np.load(os.path.join(self.index_dir, "pooled.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(self.index_dir, "scales.npy"))
+        self.offsets = np.load(os.path.join(self.index_dir, "offsets.npy"))
+
+    def _save(self) -> None:
+        os.makedirs(self.index_dir, exist_ok=True)
+        # 数组先写，index.json 最后替换，读到的 index.json 总有对应的数组
+        for name, array in (("pooled", self.pooled), ("scales", self.scales), ("offsets", self.offsets)):
+            tmp_path = os.path.join(self.index_dir, f"{name}.tmp.npy")
+            np.save(tmp_path, array)
+            os.replace(tmp_path, os.path.join(self.index_dir, f"{name}.npy"))
+        tmp_path = os.path.join(self.index_dir, "index.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "model_version": self.retriever.model_version,
+                "pool_factor": self.config["pool_factor"],
+                "papers": self.papers,
+                "pages": self.pages,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.index_dir, "index.json"))
+        self.pooled = np.load(os.path.join(self.index_dir, "pooled.npy"), mmap_mode="r")
+
+    # 建索引
+
+    def paper_names(self) -> List[str]:
+        """Paper directories in the data folder (hidden ones such as .workspaces are skipped)"""
+        if not os.path.isdir(self.data_folder):
+            return []
+        return sorted(
+            name for name in os.listdir(self.data_folder)
+            if not name.startswith(".") and os.path.isdir(os.path.join(self.data_folder, name))
+        )
+
+    def _signature(self, paper_name: str) -> Optional[List[int]]:
+        """Modification time and size of the paper's page images, None if it has none"""
+        paper_dir = os.path.join(self.data_folder, paper_name)
+        store_path = page_store_path(paper_dir)
+        image_dir = image_dir_for(paper_dir, self.retriever.render_profile)
+        source = image_dir if os.path.isdir(image_dir) else store_path
+        if not os.path.exists(source):
+            return None
+        stat = os.stat(source)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def _embed_paper(self, paper_name: str, progress_callback=None):
+        """Page records and pooled vectors of one paper, embedding pages not in its store"""
+        paper_dir = os.path.join(self.data_folder, paper_name)
+        images, image_paths = self.retriever.load_images(image_dir_for(paper_dir, self.retriever.render_profile))
+        if not images:
+            return [], []
+        store = self.retriever.embedding_store(paper_dir)
+        keys = [image_key(image) for image in images]
+        embeddings = self.retriever.embed_images(images, progress_callback, store)
+        pages = [
+            {"paper_name": paper_name, "page_name": os.path.basename(path), "key": key}
+            for path, key in zip(image_paths, keys)
+        ]
+        pooled = [pool_tokens(embedding.float().cpu().numpy(), self.config["pool_factor"]) for embedding in embeddings]
+        return pages, pooled
+
+    def prepare_documents(self, documents: Optional[List[Dict[str, Any]]] = None, progress_callback=None) -> int:
+        """
+        Bring the library index up to date
+
+        Args:
+            documents: Papers to add or refresh as {"paper_name": ...}, keeping
+                the rest of the index; when None the index is synced with the
+                data folder, dropping papers that were removed
+            progress_callback: Passed to ImageRetrieval.embed_images
+
+        Returns:
+            Number of indexed pages
+        """
+        with _LIBRARY_LOCK:
+            return self._update(documents, progress_callback)
+
+    def _update(self, documents, progress_callback) -> int:
+        if documents is None:
+            names, signatures = self.paper_names(), {}
+        else:
+            names, signatures = [doc["paper_name"] for doc in documents], dict(self.papers)
+        for name in names:
+            signature = self._signature(name)
+            if signature is not None:
+                signatures[name] = signature
+        changed = [name for name, signature in signatures.items() if self.papers.get(name) != signature]
+        if not changed and set(self.papers) == set(signatures):
+            return len(self.pages)
+
+        start = time.time()
+        print(f"[INFO] Updating library index: {len(changed)} new or changed papers")
+        # 未变化的论文沿用已有的池化向量
+        kept_pages, kept_vectors, kept_scales = [], [], []
+        for page_idx, page in enumerate(self.pages):
+            if page["paper_name"] in signatures and page["paper_name"] not in changed:
+                lo, hi = self.offsets[page_idx], self.offsets[page_idx + 1]
+                kept_pages.append(page)
+                kept_vectors.append(np.asarray(self.pooled[lo:hi]))
+                kept_scales.append(self.scales[lo:hi])
+
+        for name in changed:
+            try:
+                pages, pooled = self._embed_paper(name, progress_callback)
+            except Exception as e:
+                print(f"[WARN] Skipping {name} in library index: {e}")
+                signatures.pop(name)
+                continue
+            for page, vectors in zip(pages, pooled):
+                quantized, scales = quantize(vectors)
+                kept_pages.append(page)
+                kept_vectors.append(quantized)
+                kept_scales.append(scales)
+
+        counts = [len(vectors) for vectors in kept_vectors]
+        self.pages = kept_pages
+        self.papers = signatures
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        if kept_vectors:
+            self.pooled = np.concatenate(kept_vectors, axis=0)
+            self.scales = np.concatenate(kept_scales).astype(np.float32)
+        else:
+            self.pooled = np.zeros((0, 0), dtype=np.int8)
+            self.scales = np.zeros(0, dtype=np.float32)
+        self._stores.clear()
+        self._save()
+        print(f"[INFO] Library index: {len(self.papers)} papers, {len(self.pages)} pages, "
+              f"{len(self.scales)} pooled vectors ({time.time() - start:.1f}s)")
+        return len(self.pages)
+
+    # 检索
+
+    def process_query(self, query: str) -> np.ndarray:
+        """[q_tokens, dim] float32 query embedding without padding tokens"""
+        embedding = self.retriever.embed_queries([query])[0].float().cpu().numpy()
+        return embedding[np.abs(embedding).sum(axis=1) > 0]
+
+    def candidate_scores(self, query: np.ndarray) -> np.ndarray:
+        """Approximate MaxSim of the query against every page, from the pooled int8 vectors"""
+        scores = np.empty(len(self.pages), dtype=np.float32)
+        chunk_vectors = self.config["chunk_vectors"]
+        page_start = 0
+        while page_start < len(self.pages):
+            # 按页面边界切块，每块约 chunk_vectors 个向量
+            page_end = int(np.searchsorted(self.offsets, self.offsets[page_start] + chunk_vectors, side="right")) - 1
+            page_end = min(len(self.pages), max(page_end, page_start + 1))
+            lo, hi = self.offsets[page_start], self.offsets[page_end]
+            sims = (query @ np.asarray(self.pooled[lo:hi], dtype=np.float32).T) * self.scales[lo:hi]
+            page_max = np.maximum.reduceat(sims, self.offsets[page_start:page_end] - lo, axis=1)
+            scores[page_start:page_end] = page_max.sum(axis=0)
+            page_start = page_end
+        return scores
+
+    def _store(self, paper_name: str) -> EmbeddingStore:
+        if paper_name not in self._stores:
+            self._stores[paper_name] = self.retriever.embedding_store(os.path.join(self.data_folder, paper_name))
+        return self._stores[paper_name]
+
+    def retrieve(self, query: str, documents: Optional[List[Dict[str, Any]]] = None, top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Search every indexed page
+
+        Args:
+            query: Free-text query, e.g. "transformer architecture diagram"
+            documents: Papers to restrict the search to as {"paper_name": ...};
+                the whole library when None
+            top_k: Number of pages returned
+
+        Returns:
+            Pages as {paper_name, page_name, page_num, image_path, score}, best
+            first; image_path is None when the page image cannot be produced
+        """
+        if not self.pages:
+            self.prepare_documents()
+        if not self.pages:
+            return []
+
+        start = time.time()
+        query_embedding = self.process_query(query)
+        approx = self.candidate_scores(query_embedding)
+        if documents is not None:
+            allowed = {doc["paper_name"] for doc in documents}
+            approx[[page["paper_name"] not in allowed for page in self.pages]] = -np.inf
+        num_candidates = min(len(self.pages), max(self.config["candidates"], top_k * 10))
+        candidates = np.argpartition(-approx, num_candidates - 1)[:num_candidates]
+        candidates = candidates[np.isfinite(approx[candidates])]
+
+        # 候选页面的完整嵌入一次批量精确打分; 不在存储中时 (如存储被删除) 退回近似得分
+        scores = {int(page_idx): float(approx[page_idx]) for page_idx in candidates}
+        stored = []
+        for page_idx in candidates:
+            page = self.pages[page_idx]
+            embedding = self._store(page["paper_name"]).get(page["key"])
+            if embedding is not None:
+                stored.append((int(page_idx), torch.from_numpy(np.asarray(embedding, dtype=np.float32))))
+        if stored:
+            exact = maxsim_scores(torch.from_numpy(query_embedding)[None], [embedding for _, embedding in stored])
+            scores.update(zip([page_idx for page_idx, _ in stored], exact[0].tolist()))
+
+        results = []
+        for page_idx, score in scores.items():
+            page = self.pages[page_idx]
+            results.append({
+                "paper_name": page["paper_name"],
+                "page_name": page["page_name"],
+                "page_num": page_num_from_name(page["page_name"]),
+                "score": score,
+            })
+        results.sort(key=lambda result: -result["score"])
+        results = results[:top_k]
+        self._resolve_images(results)
+        print(f"[INFO] Library search over {len(self.pages)} pages, {len(candidates)} reranked "
+              f"({(time.time() - start) * 1000:.0f} ms)")
+        return results
+
+    def _resolve_images(self, results: List[Dict[str, Any]]) -> None:
+        """
+        Add an image_path to each result. Packed papers no longer have their
+        thumbnail files, so pages are resolved through BaseDataset.page_image,
+        which renders them from the PDF when needed
+        """
+        datasets = {}
+        for result in results:
+            result["image_path"] = None
+            paper_name = result["paper_name"]
+            try:
+                if paper_name not in datasets:
+                    datasets[paper_name] = BaseDataset(paper_name, data_folder=self.data_folder)
+                if result["page_num"] is not None:
+                    image_path = datasets[paper_name].page_image(result["page_num"], self.retriever.render_profile)
+                    result["image_path"] = image_path if os.path.exists(image_path) else None
+            except Exception as e:
+                print(f"[WARN] Could not resolve page image of {paper_name}/{result['page_name']}: {e}")
+        for dataset in datasets.values():
+            if dataset.page_store is not None:
+                dataset.page_store.close()
@@ -0,0 +1,85 @@
+"""
+Batched late-interaction (MaxSim) scoring.
+
+score(q, p) = sum over query tokens i of max over page tokens j of <q_i, p_j>
+
+All queries are scored against a chunk of pages with one einsum, so scoring
+stays on the device the embeddings live on and the result is a [queries,
+pages] tensor with no round trip through Python lists. Pages (and queries)
+of different lengths are padded; padded page tokens are masked out of the
+max and padded query tokens out of the sum, so padding never changes a
+score. Pages are processed in chunks sized to keep the [queries, pages,
+query tokens, page tokens] similarity tensor under chunk_bytes.
+"""
+
+from typing import Optional, Sequence, Tuple, Union
+
+import torch
+
+Embeddings = Union[torch.Tensor, Sequence[torch.Tensor]]
+
+DEFAULT_CHUNK_BYTES = 256 * 1024 * 1024
+
+
+def pad_embeddings(embeddings: Embeddings, device=None) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Stack [tokens, dim] embeddings of different lengths
+
+    Returns:
+        (padded [n, max tokens, dim], mask [n, max tokens], True for real tokens)
+    """
+    if isinstance(embeddings, torch.Tensor):
+        embeddings = embeddings.to(device) if device is not None else embeddings
+        return embeddings, torch.ones(embeddings.shape[:2], dtype=torch.bool, device=embeddings.device)
+    embeddings = [torch.as_tensor(embedding) for embedding in embeddings]
+    device = device if device is not None else embeddings[0].device
+    padded = torch.nn.utils.rnn.pad_sequence(embeddings, batch_first=True).to(device)
+    lengths = torch.tensor([embedding.shape[0] for embedding in embeddings], device=device)
+    mask = torch.arange(padded.shape[1], device=device)[None, :] < lengths[:, None]
+    return padded, mask
+
+
+def maxsim_scores(
+    queries: Embeddings,
+    pages: Embeddings,
+    query_mask: Optional[torch.Tensor] = None,
+    page_mask: Optional[torch.Tensor] = None,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    dtype: torch.dtype = torch.float32,
+) -> torch.Tensor:
+    """
+    MaxSim of every query against every page
+
+    Args:
+        queries: [queries, tokens, dim] tensor or list of [tokens, dim] tensors
+        pages: [pages, tokens, dim] tensor or list of [tokens, dim] tensors
+        query_mask / page_mask: [n, tokens] bool masks of real tokens; derived
+            from the list lengths when lists are given, all True otherwise
+        chunk_bytes: Upper bound for the similarity tensor of one page chunk
+        dtype: Dtype the similarities are computed in
+
+    Returns:
+        [queries, pages] float32 tensor on the pages' device
+    """
+    pages, list_page_mask = pad_embeddings(pages)
+    queries, list_query_mask = pad_embeddings(queries, device=pages.device)
+    page_mask = (page_mask if page_mask is not None else list_page_mask).to(pages.device)
+    query_mask = (query_mask if query_mask is not None else list_query_mask).to(pages.device)
+
+    num_queries, query_tokens = queries.shape[:2]
+    num_pages, page_tokens = pages.shape[:2]
+    queries = queries.to(dtype)
+    bytes_per_page = max(1, num_queries * query_tokens * page_tokens * torch.finfo(dtype).bits // 8)
+    chunk_pages = max(1, chunk_bytes // bytes_per_page)
+
+    scores = torch.empty((num_queries, num_pages), dtype=torch.float32, device=pages.device)
+    with torch.no_grad():
+        for start in range(0, num_pages, chunk_pages):
+            chunk = pages[start:start + chunk_pages].to(dtype)
+            # [queries, pages, query tokens, page tokens]
+            sims = torch.einsum("qid,pjd->qpij", queries, chunk)
+            sims.masked_fill_(~page_mask[start:start + chunk_pages][None, :, None, :], float("-inf"))
+            best = sims.amax(dim=3)
+            best.masked_fill_(~query_mask[:, None, :], 0)
+            scores[:, start:start + chunk_pages] = best.sum(dim=2).float()
+    return scores
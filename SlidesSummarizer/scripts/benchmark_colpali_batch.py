@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark batched ColPali page embedding.
+
+Embeds a paper's retrieval thumbnails with batch sizes 1, 2, 4, ... up to
+--max-batch, on the CPU and on the accelerator if one is present, and reports
+pages/second for each. A batch size that runs out of memory is halved by
+ImageRetrieval.embed_batch; the batch size actually used is reported.
+
+Examples:
+    python scripts/benchmark_colpali_batch.py --paper_name brainmvp
+    python scripts/benchmark_colpali_batch.py --paper_name brainmvp --devices cuda --max-batch 64
+"""
+import os
+import sys
+import gc
+import time
+import argparse
+from typing import List
+
+import torch
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from retrieval.image_retrieval import ImageRetrieval
+from scripts.render_profiles import image_dir_for
+
+
+def available_devices() -> List[str]:
+    devices = ["cpu"]
+    if torch.cuda.is_available():
+        devices.append("cuda")
+    elif getattr(torch.backends, "mps", None) is not None and torch.backends.mps.is_available():
+        devices.append("mps")
+    return devices
+
+
+def synchronize(device: str) -> None:
+    if device == "cuda":
+        torch.cuda.synchronize()
+    elif device == "mps":
+        torch.mps.synchronize()
+
+
+def batch_sizes(max_batch: int) -> List[int]:
+    sizes, size = [], 1
+    while size <= max_batch:
+        sizes.append(size)
+        size *= 2
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched ColPali page embedding")
+    parser.add_argument("--paper_name", required=True, help="Paper folder in the data folder")
+    parser.add_argument("-d", "--data-folder", default="data", help="Path to the data folder containing papers")
+    parser.add_argument("--devices", default=",".join(available_devices()), help="Comma-separated devices")
+    parser.add_argument("--max-batch", type=int, default=16, help="Largest batch size")
+    parser.add_argument("--pages", type=int, default=32, help="Pages embedded per measurement")
+    args = parser.parse_args()
+
+    image_dir = image_dir_for(os.path.join(args.data_folder, args.paper_name), ImageRetrieval.render_profile)
+    results = []
+    for device in [name.strip() for name in args.devices.split(",") if name.strip()]:
+        # 不复用存储的嵌入，否则除第一次外测到的都是读取
+        retriever = ImageRetrieval(device_map=device, batch_size=1, persist_embeddings=False)
+        images, _ = retriever.load_images(image_dir)
+        if not images:
+            parser.error(f"No page images found for {args.paper_name}")
+        # 页面不足时重复使用，保证每次测量的页数相同
+        images = (images * (args.pages // len(images) + 1))[:args.pages]
+
+        # 预热，排除首次调用的初始化开销
+        retriever.embed_batch(images[:1])
+        for size in batch_sizes(args.max_batch):
+            retriever.batch_size = size
+            synchronize(device)
+            start = time.perf_counter()
+            retriever.embed_images(images)
+            synchronize(device)
+            seconds = time.perf_counter() - start
+            results.append((device, size, retriever.batch_size, len(images) / seconds))
+            print(f"[INFO] {device} batch {size}: {len(images) / seconds:.2f} pages/s")
+
+        del retriever
+        gc.collect()
+        if device == "cuda":
+            torch.cuda.empty_cache()
+
+    print(f"\nPaper: {args.paper_name}, pages per run: {args.pages}")
+    print(f"{'device':<8} {'batch':>6} {'used':>6} {'pages/s':>10} {'speedup':>8}")
+    for device, size, used, rate in results:
+        baseline = next(r for d, s, _, r in results if d == device and s == 1)
+        print(f"{device:<8} {size:>6} {used:>6} {rate:>10.2f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Benchmark page image codecs.
+
+For every page the pixmap is rendered once with a render profile, then encoded
+with each codec. Reports encode time, file size, decode time and PSNR against
+the raw pixmap. With --summarize, the full multi-agent summary is also run once
+per codec and compared with the PNG summary, to show any quality change.
+
+Examples:
+    python scripts/benchmark_image_codecs.py --paper_name brainmvp
+    python scripts/benchmark_image_codecs.py --pdf paper.pdf --codecs png,jpeg:90,jpeg:75,webp:80
+    python scripts/benchmark_image_codecs.py --paper_name brainmvp --summarize
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import difflib
+import argparse
+import tempfile
+from typing import List, Optional, Tuple
+
+import numpy as np
+import fitz  # PyMuPDF
+from PIL import Image
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.page_store import page_store_path
+from scripts.render_profiles import IMAGE_CODECS, RENDER_PROFILES, content_clip, profile_zoom, save_pixmap
+
+
+def parse_codecs(spec: str) -> List[Tuple[str, Optional[int]]]:
+    """"png,jpeg:85,webp:80" -> [("png", None), ("jpeg", 85), ("webp", 80)]"""
+    codecs = []
+    for item in spec.split(","):
+        name, _, quality = item.strip().partition(":")
+        if name not in IMAGE_CODECS:
+            raise ValueError(f"Unknown codec {name}, expected one of {list(IMAGE_CODECS)}")
+        codecs.append((name, int(quality) if quality else None))
+    return codecs
+
+
+def codec_label(codec: str, quality: Optional[int]) -> str:
+    return codec if quality is None else f"{codec}:{quality}"
+
+
+def psnr(reference: np.ndarray, decoded: np.ndarray) -> float:
+    mse = np.mean((reference.astype(np.float64) - decoded.astype(np.float64)) ** 2)
+    if mse == 0:
+        return float("inf")
+    return 10 * np.log10(255.0 ** 2 / mse)
+
+
+def benchmark_encoding(pdf_path: str, profile_name: str, codecs, max_pages: int, work_dir: str) -> dict:
+    profile = RENDER_PROFILES[profile_name]
+    stats = {codec_label(*c): {"encode_s": 0.0, "decode_s": 0.0, "bytes": 0, "psnr": []} for c in codecs}
+    pdf_document = fitz.open(pdf_path)
+    num_pages = min(len(pdf_document), max_pages)
+    for page_idx in range(num_pages):
+        page = pdf_document[page_idx]
+        clip = content_clip(page) if profile.get("crop") else page.rect
+        zoom = profile_zoom(clip, profile)
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+        reference = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.width, 3)
+
+        for codec, quality in codecs:
+            entry = stats[codec_label(codec, quality)]
+            image_path = os.path.join(work_dir, f"{page_idx + 1:02d}.{IMAGE_CODECS[codec]['ext']}")
+
+            start = time.perf_counter()
+            save_pixmap(pixmap, image_path, codec, quality)
+            entry["encode_s"] += time.perf_counter() - start
+            entry["bytes"] += os.path.getsize(image_path)
+
+            start = time.perf_counter()
+            with Image.open(image_path) as image:
+                decoded = np.asarray(image.convert("RGB"))
+            entry["decode_s"] += time.perf_counter() - start
+            entry["psnr"].append(psnr(reference, decoded))
+    pdf_document.close()
+
+    for entry in stats.values():
+        finite = [v for v in entry["psnr"] if v != float("inf")]
+        entry["psnr"] = min(finite) if finite else float("inf")  # worst page
+        entry["pages"] = num_pages
+    return stats
+
+
+def summarize_with_codec(paper_name: str, data_folder: str, codec: str, quality: Optional[int], overrides: List[str]) -> str:
+    """Run the multi-agent summary with pages rendered by a codec, in a scratch copy of the paper"""
+    from hydra import initialize_config_dir, compose
+    from scripts.predict import resolve_agent_configs
+    from mydatasets.base_dataset import BaseDataset
+    from agents.slides_summary_agent import SlidesSummaryAgent
+
+    config_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "config"))
+    with initialize_config_dir(config_dir=config_dir, version_base="1.2"):
+        cfg = compose(config_name="base", overrides=overrides)
+        resolve_agent_configs(cfg)
+
+    source_dir = os.path.join(data_folder, paper_name)
+    scratch = tempfile.mkdtemp(prefix=f"codec-{codec}-")
+    try:
+        paper_dir = os.path.join(scratch, paper_name)
+        os.makedirs(paper_dir)
+        # only the inputs; every page image is re-rendered with the codec under test
+        for name in (f"{paper_name}.pdf", "content.json"):
+            shutil.copy(os.path.join(source_dir, name), paper_dir)
+        if os.path.exists(page_store_path(source_dir)):
+            shutil.copy(page_store_path(source_dir), paper_dir)
+        if os.path.isdir(os.path.join(source_dir, "retrieval")):
+            shutil.copytree(os.path.join(source_dir, "retrieval"), os.path.join(paper_dir, "retrieval"))
+        dataset = BaseDataset(paper_name, data_folder=scratch, image_codec=codec, image_quality=quality)
+        summary, all_messages = SlidesSummaryAgent(cfg).predict(dataset)
+        return summary
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark page image codecs")
+    parser.add_argument("--paper_name", help="Paper folder in the data folder (uses <paper_name>/<paper_name>.pdf)")
+    parser.add_argument("--pdf", help="PDF file to benchmark instead of a paper folder")
+    parser.add_argument("-d", "--data-folder", default="data", help="Path to the data folder containing papers")
+    parser.add_argument("--profile", choices=list(RENDER_PROFILES), default="vlm", help="Render profile")
+    parser.add_argument("--codecs", default="png,jpeg:90,jpeg:80,webp:90,webp:80", help="Comma-separated codec[:quality]")
+    parser.add_argument("-m", "--max-pages", type=int, default=30, help="Maximum pages to benchmark")
+    parser.add_argument("--summarize", action="store_true", help="Also compare summaries produced with each codec")
+    parser.add_argument("--overrides", nargs="*", default=[], help="Hydra overrides for --summarize")
+    args = parser.parse_args()
+
+    if not args.pdf and not args.paper_name:
+        parser.error("one of --pdf or --paper_name is required")
+    pdf_path = args.pdf or os.path.join(args.data_folder, args.paper_name, f"{args.paper_name}.pdf")
+    if not os.path.exists(pdf_path):
+        parser.error(f"PDF not found at {pdf_path}")
+    codecs = parse_codecs(args.codecs)
+
+    work_dir = tempfile.mkdtemp(prefix="codec-bench-")
+    try:
+        stats = benchmark_encoding(pdf_path, args.profile, codecs, args.max_pages, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = stats[codec_label(*codecs[0])]
+    print(f"\nProfile: {args.profile}, pages: {baseline['pages']}, baseline: {codec_label(*codecs[0])}")
+    print(f"{'codec':<10} {'encode ms/page':>15} {'KB/page':>10} {'size':>7} {'decode ms/page':>15} {'min PSNR dB':>12}")
+    for label, entry in stats.items():
+        pages = max(entry["pages"], 1)
+        print(
+            f"{label:<10} {1000 * entry['encode_s'] / pages:>15.1f} {entry['bytes'] / 1024 / pages:>10.1f} "
+            f"{entry['bytes'] / max(baseline['bytes'], 1):>6.0%} {1000 * entry['decode_s'] / pages:>15.1f} "
+            f"{entry['psnr']:>12.1f}"
+        )
+
+    if args.summarize:
+        if not args.paper_name:
+            parser.error("--summarize needs --paper_name")
+        summaries = {}
+        for codec, quality in codecs:
+            label = codec_label(codec, quality)
+            start = time.time()
+            summaries[label] = summarize_with_codec(args.paper_name, args.data_folder, codec, quality, args.overrides)
+            print(f"[INFO] Summary with {label} took {time.time() - start:.1f}s")
+        reference = summaries[codec_label(*codecs[0])]
+        print(f"\n{'codec':<10} {'similarity to baseline':>24}")
+        for label, summary in summaries.items():
+            ratio = difflib.SequenceMatcher(None, reference, summary).ratio()
+            print(f"{label:<10} {ratio:>24.3f}")
+        print("Note: LLM sampling varies between runs; compare against a second baseline run for the noise floor.")
+        print(json.dumps(summaries, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
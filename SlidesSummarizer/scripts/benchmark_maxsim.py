@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark MaxSim scoring: retrieval/maxsim.py against the CustomEvaluator
+path ImageRetrieval.score_queries used before.
+
+Uses random unit-norm embeddings shaped like ColPali's (1030 tokens per page,
+query tokens padded to --query-tokens, 128 dims), so no model or paper is
+needed. Each run scores the queries against the pages and takes the top-k;
+the new scores are checked against the old ones.
+
+Examples:
+    python scripts/benchmark_maxsim.py
+    python scripts/benchmark_maxsim.py --device cuda --pages 16,256,4096 --queries 8
+"""
+import os
+import sys
+import time
+import argparse
+
+import torch
+from colpali_engine.trainer.retrieval_evaluator import CustomEvaluator
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from retrieval.maxsim import maxsim_scores
+
+
+def synchronize(device: str) -> None:
+    if device == "cuda":
+        torch.cuda.synchronize()
+
+
+def random_embeddings(n: int, tokens: int, dim: int, device: str) -> torch.Tensor:
+    embeddings = torch.randn(n, tokens, dim, device=device)
+    return embeddings / embeddings.norm(dim=-1, keepdim=True)
+
+
+def evaluator_scores(queries: torch.Tensor, pages: torch.Tensor) -> torch.Tensor:
+    """The previous score_queries"""
+    evaluator = CustomEvaluator(is_multi_vector=True)
+    return torch.tensor(evaluator.evaluate(queries, pages))
+
+
+def timed(func, repeat: int, device: str):
+    func()  # 预热
+    synchronize(device)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    synchronize(device)
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MaxSim scoring")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--pages", default="16,128,1024", help="Comma-separated page counts")
+    parser.add_argument("--queries", type=int, default=2, help="Queries scored together")
+    parser.add_argument("--query-tokens", type=int, default=24)
+    parser.add_argument("--page-tokens", type=int, default=1030)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--top_k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    queries = random_embeddings(args.queries, args.query_tokens, args.dim, args.device)
+    print(f"{'pages':>6} {'evaluator ms':>13} {'maxsim ms':>10} {'speedup':>8} {'max diff':>9} {'top-k same':>10}")
+    for num_pages in [int(n) for n in args.pages.split(",") if n.strip()]:
+        pages = random_embeddings(num_pages, args.page_tokens, args.dim, args.device)
+        top_k = min(args.top_k, num_pages)
+
+        _, old_seconds = timed(
+            lambda pages=pages: torch.topk(evaluator_scores(queries, pages), top_k, dim=-1), args.repeat, args.device
+        )
+        _, new_seconds = timed(
+            lambda pages=pages: torch.topk(maxsim_scores(queries, pages), top_k, dim=-1), args.repeat, args.device
+        )
+
+        old = evaluator_scores(queries, pages).float()
+        new = maxsim_scores(queries, pages).cpu()
+        diff = (old - new).abs().max().item()
+        same = torch.equal(torch.topk(old, top_k).indices, torch.topk(new, top_k).indices)
+        print(f"{num_pages:>6} {old_seconds * 1000:>13.2f} {new_seconds * 1000:>10.2f} "
+              f"{old_seconds / new_seconds:>7.2f}x {diff:>9.2e} {str(same):>10}")
+
+        del pages
+        if args.device == "cuda":
+            torch.cuda.empty_cache()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Check ColPali retrieval accuracy at reduced precision.
+
+Embeds the pages of each paper with the fp32 model and with each precision
+under test (bf16, int8; see PRECISIONS in retrieval/image_retrieval.py), scores the special
+queries plus any --query, and reports for every precision against fp32:
+
+    overlap@k   share of fp32's top-k pages also in the precision's top-k,
+                averaged over queries
+    max diff    largest absolute score difference, relative to fp32's
+                score range for that query
+    pages/s     page embedding throughput
+
+Models are loaded one at a time, so peak memory is that of the fp32 model.
+Exits with status 1 when an overlap falls below --min-overlap.
+
+Examples:
+    python scripts/check_colpali_precision.py
+    python scripts/check_colpali_precision.py --precisions int8 --top_k 5 --query "ablation study table"
+"""
+import os
+import sys
+import gc
+import time
+import argparse
+from typing import Dict
+
+import torch
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from retrieval.image_retrieval import ImageRetrieval
+from scripts.render_profiles import image_dir_for
+
+
+def embed_papers(precision: str, args) -> Dict[str, dict]:
+    """Scores [queries, pages] and throughput of every paper at one precision"""
+    retriever = ImageRetrieval(device_map=args.device, precision=precision, persist_embeddings=False)
+    queries = list(retriever.special_queries.values()) + args.query
+    results = {}
+    for paper_name in args.papers.split(","):
+        image_dir = image_dir_for(os.path.join(args.data_folder, paper_name), ImageRetrieval.render_profile)
+        start = time.perf_counter()
+        index = retriever.build_index(image_dir)
+        seconds = time.perf_counter() - start
+        if not len(index):
+            print(f"[WARN] No page images found for {paper_name}")
+            continue
+        results[paper_name] = {
+            "scores": retriever.score_queries(queries, index.embeddings).float().cpu(),
+            "pages_per_second": len(index) / seconds,
+        }
+    del retriever
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    return results
+
+
+def compare(baseline: torch.Tensor, scores: torch.Tensor, top_k: int):
+    """(overlap@k averaged over queries, largest score difference relative to the baseline range)"""
+    top_k = min(top_k, baseline.shape[1])
+    base_top = torch.topk(baseline, top_k, dim=-1).indices.tolist()
+    top = torch.topk(scores, top_k, dim=-1).indices.tolist()
+    overlap = sum(len(set(a) & set(b)) / top_k for a, b in zip(base_top, top)) / len(base_top)
+    ranges = (baseline.max(dim=1).values - baseline.min(dim=1).values).clamp(min=1e-6)
+    diff = ((scores - baseline).abs().max(dim=1).values / ranges).max().item()
+    return overlap, diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ColPali top-k pages at reduced precision with fp32")
+    parser.add_argument("-d", "--data-folder", default="data", help="Path to the data folder containing papers")
+    parser.add_argument("--papers", default="brainmvp,2504.18524v1", help="Comma-separated paper folders")
+    parser.add_argument("--precisions", default="bf16,int8", help="Comma-separated precisions compared with fp32")
+    parser.add_argument("--device", default="cpu", help="Device for fp32 and bf16; int8 always runs on the CPU")
+    parser.add_argument("--top_k", type=int, default=3, help="Pages compared per query")
+    parser.add_argument("--query", action="append", default=[], help="Extra query; may be repeated")
+    parser.add_argument("--min-overlap", type=float, default=2 / 3, help="Fail below this overlap@k")
+    args = parser.parse_args()
+
+    precisions = [name.strip() for name in args.precisions.split(",") if name.strip() and name.strip() != "fp32"]
+    results = {precision: embed_papers(precision, args) for precision in ["fp32"] + precisions}
+
+    failed = False
+    print(f"\n{'paper':<16} {'precision':<10} {'overlap@' + str(args.top_k):>10} {'max diff':>9} {'pages/s':>8}")
+    for paper_name, baseline in results["fp32"].items():
+        print(f"{paper_name:<16} {'fp32':<10} {1.0:>10.2f} {0.0:>9.3f} {baseline['pages_per_second']:>8.2f}")
+        for precision, paper_results in results.items():
+            if precision == "fp32" or paper_name not in paper_results:
+                continue
+            result = paper_results[paper_name]
+            overlap, diff = compare(baseline["scores"], result["scores"], args.top_k)
+            failed |= overlap < args.min_overlap
+            print(f"{paper_name:<16} {precision:<10} {overlap:>10.2f} {diff:>9.3f} {result['pages_per_second']:>8.2f}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
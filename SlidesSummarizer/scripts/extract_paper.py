@@ -6,47 +6,193 @@ import time
 import fitz  # PyMuPDF
 import shutil
 import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from PIL import Image
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List, Callable, NamedTuple, Optional, Sequence, Tuple, Union
 
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-def extract_paper(
-    paper_name: str, 
+from scripts.figures import extract_figures
+from scripts.layout import build_structure, page_layout
+from scripts.page_store import PageStoreWriter, page_store_path
+from scripts.render_profiles import (
+    DEFAULT_PROFILES, FITZ_LOCK, IMAGE_CODECS, RENDER_PROFILES, page_filename, render_page, profile_dir
+)
+
+# 渲染进程池按 worker 数缓存，避免每篇论文重新启动进程
+_RENDER_POOLS: Dict[int, ProcessPoolExecutor] = {}
+_RENDER_POOLS_LOCK = threading.Lock()
+
+
+def get_render_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Shared process pool for page rendering. Uses the spawn start method: the
+    backend calls this from worker threads of a process that holds CUDA
+    state, which must not be forked.
+    """
+    with _RENDER_POOLS_LOCK:
+        pool = _RENDER_POOLS.get(workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _RENDER_POOLS[workers] = pool
+        return pool
+
+
+def render_pages(
+    pdf_document,
+    start: int,
+    end: int,
+    extraction_dir: str,
+    profiles: Sequence[str],
+    resolution: int,
+    on_page: Optional[Callable[[int, str, float], None]] = None,
+    codec: str = "png",
+    quality: Optional[int] = None
+) -> List[Tuple[int, str, float, Dict[str, Any]]]:
+    """
+    Extract text and render pages [start, end) of an open document once per
+    render profile, to <extraction_dir>/<profile dir>/NN_page.<ext>.
+
+    Returns:
+        (page_num, text, seconds, layout) for each page, layout being the
+        page_layout() lines and tables used to build the text structure
+    """
+    pages = []
+    for page_idx in range(start, end):
+        page_start = time.time()
+        page = pdf_document[page_idx]
+        page_num = page_idx + 1
+        
+        # 提取文本，以及带字号、位置的文本行 (用于识别章节、图表标题)
+        text = page.get_text()
+        layout = page_layout(page)
+        
+        # 提取图像 - 按每个 profile 的目标尺寸直接渲染整页
+        for profile_name in profiles:
+            render_page(page, page_num, extraction_dir, profile_name, resolution, codec=codec, quality=quality)
+        
+        """
+        # 提取页面上的内嵌图像
+        image_list = page.get_images(full=True)
+        
+        # 遍历图像
+        for img_idx, img_info in enumerate(image_list):
+            img_idx += 1
+            xref = img_info[0]  # 图像引用
+            
+            try:
+                base_img = pdf_document.extract_image(xref)
+                image_bytes = base_img["image"]
+                image_ext = base_img["ext"]
+                
+                # 保存图像
+                image_filename = f"{page_num:02d}_{img_idx:02d}.{image_ext}"
+                image_path = os.path.join(profile_dir(extraction_dir, "vlm"), image_filename)
+                
+                with open(image_path, "wb") as img_file:
+                    img_file.write(image_bytes)
+                
+                # 检查图像是否太小（可能是图标等）
+                with Image.open(image_path) as img:
+                    width, height = img.size
+                    if width < 100 or height < 100:
+                        # 太小的图像可能不是重要图表
+                        os.remove(image_path)
+                        continue
+            except Exception as e:
+                print(f"Error extracting image {img_idx} from page {page_num}: {e}")
+        """
+        pages.append((page_num, text, time.time() - page_start, layout))
+        if on_page:
+            on_page(page_num, text, pages[-1][2])
+    return pages
+
+
+def render_page_range(
+    source: Union[str, bytes],
+    start: int,
+    end: int,
+    extraction_dir: str,
+    profiles: Sequence[str],
+    resolution: int,
+    codec: str = "png",
+    quality: Optional[int] = None
+) -> List[Tuple[int, str, float, Dict[str, Any]]]:
+    """
+    Process-pool entry point for render_pages. Opens its own fitz document,
+    since documents cannot be shared between processes.
+    """
+    if isinstance(source, bytes):
+        pdf_document = fitz.open(stream=source, filetype="pdf")
+    else:
+        pdf_document = fitz.open(source)
+    try:
+        return render_pages(pdf_document, start, end, extraction_dir, profiles, resolution, None, codec, quality)
+    finally:
+        pdf_document.close()
+
+
+def shard_pages(page_count: int, num_shards: int) -> List[Tuple[int, int]]:
+    """Split [0, page_count) into at most num_shards contiguous ranges of near-equal size"""
+    num_shards = max(1, min(num_shards, page_count))
+    bounds = [page_count * i // num_shards for i in range(num_shards + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(num_shards) if bounds[i] < bounds[i + 1]]
+
+
+class PageRecord(NamedTuple):
+    """One extracted page, as yielded by stream_paper"""
+    page_num: int
+    num_pages: int
+    text: str
+    image: Optional[Image.Image]  # the image_profile render, None if that profile is not rendered
+    image_path: Optional[str]
+    seconds: float
+
+
+def stream_paper(
+    paper_name: str,
     data_folder: str = "data",
     output_dir: str = "data",
-    resolution: int = 300, 
-    max_pages: int = 30, 
-    max_chars_per_page: int = 4000
-) -> Dict[str, Any]:
+    resolution: int = 300,
+    max_pages: Optional[int] = None,
+    progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    pdf_bytes: Optional[bytes] = None,
+    workers: int = 1,
+    profiles: Sequence[str] = DEFAULT_PROFILES,
+    codec: str = "png",
+    quality: Optional[int] = None,
+    image_profile: Optional[str] = "retrieval",
+    figures: bool = False,
+    page_store: bool = True,
+    max_chars_per_page: Optional[int] = None
+) -> Iterator[PageRecord]:
     """
-    Extract text and images from a PDF paper
-    
-    Args:
-        paper_name: Name of the paper (filename without extension)
-        data_folder: Path to the data folder containing papers
-        output_dir: Output directory for extracted content
-        resolution: Image resolution in DPI
-        max_pages: Maximum pages to process
-        max_chars_per_page: Maximum characters per page
-        
-    Returns:
-        Dictionary containing extraction results
+    Extract a PDF paper page by page, yielding a PageRecord as soon as each
+    page is rendered, so later stages (ColPali embedding) can start on the
+    first pages while the rest are still rendering. content.json is written
+    once the last page has been yielded: the per-page text as before, plus
+    a "structure" entry with sections, captions, tables, references and the
+    abstract (see scripts/layout.py). With page_store, the text and the
+    rendered page images are then packed into pages.bin.
+
+    Arguments are those of extract_paper. Figures (figures=True) are
+    extracted after the last page. image_profile selects which render
+    is loaded into PageRecord.image. With workers > 1, pages arrive in
+    completion order, one shard at a time; PageRecord.page_num gives the order.
+
+    Raises:
+        FileNotFoundError: If the PDF does not exist and pdf_bytes is not given
     """
-    start_time = time.time()
-    
     # Build the PDF path from paper name and data folder
     pdf_path = os.path.join(data_folder,f"{paper_name}", f"{paper_name}.pdf")
     
     # Ensure the PDF exists
-    if not os.path.exists(pdf_path):
-        print(f"Error: PDF not found at {pdf_path}")
-        return {
-            "extraction_dir": None,
-            "num_pages": 0,
-            "extraction_time": time.time() - start_time,
-            "error": f"PDF not found at {pdf_path}"
-        }
+    if pdf_bytes is None and not os.path.exists(pdf_path):
+        raise FileNotFoundError(f"PDF not found at {pdf_path}")
     
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
@@ -57,94 +203,205 @@ def extract_paper(
     if not os.path.exists(extraction_dir):
         os.makedirs(extraction_dir)
 
-    images_dir = os.path.join(extraction_dir, "images")
-    if not os.path.exists(images_dir):
-        os.makedirs(images_dir)
+    for profile_name in profiles:
+        os.makedirs(profile_dir(extraction_dir, profile_name), exist_ok=True)
+    
+    # 保留 PDF，供 BaseDataset 按需渲染其余 profile 的页面
+    output_pdf_path = os.path.join(extraction_dir, f"{paper_name}.pdf")
+    if pdf_bytes is not None:
+        with open(output_pdf_path, "wb") as f:
+            f.write(pdf_bytes)
+    elif os.path.abspath(output_pdf_path) != os.path.abspath(pdf_path):
+        shutil.copyfile(pdf_path, output_pdf_path)
+    
+    # 打开PDF文件 (本进程内的 PyMuPDF 调用需串行，只在调用期间持有锁，不跨 yield)
+    with FITZ_LOCK:
+        if pdf_bytes is not None:
+            pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
+        else:
+            pdf_document = fitz.open(pdf_path)
+        page_count = len(pdf_document) if not max_pages else min(len(pdf_document), max_pages)
+    
+    def record(page_num, text, seconds, layout):
+        if progress_callback:
+            progress_callback("extract_page", {
+                "page": page_num,
+                "num_pages": page_count,
+                "seconds": seconds
+            })
+        image, image_path = None, None
+        if image_profile in profiles:
+            image_path = os.path.join(profile_dir(extraction_dir, image_profile), page_filename(page_num, codec))
+            with Image.open(image_path) as img:
+                image = img.convert("RGB")
+        return PageRecord(page_num, page_count, text, image, image_path, seconds)
+    
+    rendered = []
+    try:
+        if workers > 1 and page_count > 1:
+            # 按页码区间分片到多个进程，每个进程打开自己的 fitz 文档；
+            # 分片数为进程数的两倍，让第一批页面更早到达下游
+            source = pdf_bytes if pdf_bytes is not None else pdf_path
+            pool = get_render_pool(workers)
+            futures = [
+                pool.submit(
+                    render_page_range, source, shard_start, shard_end,
+                    extraction_dir, profiles, resolution, codec, quality
+                )
+                for shard_start, shard_end in shard_pages(page_count, workers * 2)
+            ]
+            for future in as_completed(futures):
+                for page in future.result():
+                    rendered.append(page)
+                    yield record(*page)
+        else:
+            for page_idx in range(page_count):
+                with FITZ_LOCK:
+                    page = render_pages(
+                        pdf_document, page_idx, page_idx + 1, extraction_dir, profiles, resolution, None, codec, quality
+                    )[0]
+                rendered.append(page)
+                yield record(*page)
+    finally:
+        with FITZ_LOCK:
+            pdf_document.close()
     
-    # 存储结果的数据结构
+    # 存储结果的数据结构 (按页码排序，与逐页处理时的结果一致)
     result = {
         "title": paper_name,
-        "pages": []
+        "pages": [],
+        # 章节、图表标题、表格、参考文献和摘要 (见 scripts/layout.py)
+        "structure": build_structure({page[0]: page[3] for page in rendered})
     }
+    rendered.sort(key=lambda page: page[0])
+    if max_chars_per_page:
+        # content.json 和 pages.bin 使用同一份截断后的文本
+        rendered = [(page_num, text[:max_chars_per_page], seconds, layout) for page_num, text, seconds, layout in rendered]
+    for page_num, text, seconds, layout in rendered:
+        result["pages"].append({
+            "page_num": page_num,
+            "text": text
+        })
     
-    # 打开PDF文件
-    try:
-        pdf_document = fitz.open(pdf_path)
-        page_count = min(len(pdf_document), max_pages)
-        
-        # 遍历页面
-        for page_idx in range(page_count):
-            page = pdf_document[page_idx]
-            page_num = page_idx + 1
-            
-            # 提取文本
-            text = page.get_text()
-            #if len(text) > max_chars_per_page:
-            #    text = text[:max_chars_per_page]
-            
-            # 存储页面信息
-            page_info = {
-                "page_num": page_num,
-                "text": text
-            }
-            result["pages"].append(page_info)
-            
-            # 提取图像 - 保存整页为图像
-            pixmap = page.get_pixmap(matrix=fitz.Matrix(resolution/72, resolution/72))
-            image_path = os.path.join(images_dir, f"{page_num:02d}_page.png")
-            pixmap.save(image_path)
-            
-            """
-            # 提取页面上的内嵌图像
-            image_list = page.get_images(full=True)
-            
-            # 遍历图像
-            for img_idx, img_info in enumerate(image_list):
-                img_idx += 1
-                xref = img_info[0]  # 图像引用
-                
-                try:
-                    base_img = pdf_document.extract_image(xref)
-                    image_bytes = base_img["image"]
-                    image_ext = base_img["ext"]
-                    
-                    # 保存图像
-                    image_filename = f"{page_num:02d}_{img_idx:02d}.{image_ext}"
-                    image_path = os.path.join(images_dir, image_filename)
-                    
-                    with open(image_path, "wb") as img_file:
-                        img_file.write(image_bytes)
-                    
-                    # 检查图像是否太小（可能是图标等）
-                    with Image.open(image_path) as img:
-                        width, height = img.size
-                        if width < 100 or height < 100:
-                            # 太小的图像可能不是重要图表
-                            os.remove(image_path)
-                            continue
-                except Exception as e:
-                    print(f"Error extracting image {img_idx} from page {page_num}: {e}")
-            """
-        
-        # 保存提取的内容到JSON文件
-        content_path = os.path.join(extraction_dir, "content.json")
-        with open(content_path, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
-        
-        # 关闭PDF文档
-        pdf_document.close()
+    # 保存提取的内容到JSON文件
+    content_path = os.path.join(extraction_dir, "content.json")
+    with open(content_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False)
+    
+    if page_store:
+        # 文本和预先渲染的页面图片打包进 pages.bin，单页图片文件随后删除
+        packed = []
+        writer = PageStoreWriter(page_store_path(extraction_dir))
+        try:
+            for page_num, text, seconds, layout in rendered:
+                images = {
+                    profile_name: os.path.join(profile_dir(extraction_dir, profile_name), page_filename(page_num, codec))
+                    for profile_name in profiles
+                }
+                writer.add_page(page_num, text, images)
+                packed.extend(images.values())
+            writer.close(paper_name, result["structure"])
+        except Exception:
+            writer.abort()
+            raise
+        for image_path in packed:
+            os.remove(image_path)
+        for profile_name in profiles:
+            if not os.listdir(profile_dir(extraction_dir, profile_name)):
+                os.rmdir(profile_dir(extraction_dir, profile_name))
+    
+    if figures:
+        # 内嵌图表: 按 xref 和内容哈希去重，记录位置和标题 (见 scripts/figures.py)
+        with FITZ_LOCK:
+            pdf_document = fitz.open(output_pdf_path)
+            try:
+                extract_figures(pdf_document, page_count, extraction_dir, result["structure"], codec, quality)
+            finally:
+                pdf_document.close()
+
+
+def extract_paper(
+    paper_name: str, 
+    data_folder: str = "data",
+    output_dir: str = "data",
+    resolution: int = 300, 
+    max_pages: Optional[int] = None, 
+    max_chars_per_page: Optional[int] = None,
+    progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    pdf_bytes: Optional[bytes] = None,
+    workers: int = 1,
+    profiles: Sequence[str] = DEFAULT_PROFILES,
+    codec: str = "png",
+    quality: Optional[int] = None,
+    figures: bool = False,
+    page_store: bool = True
+) -> Dict[str, Any]:
+    """
+    Extract text and images from a PDF paper. content.json holds the text of
+    each page and the paper's layout structure (sections, captions, tables,
+    references, abstract)
+    
+    Args:
+        paper_name: Name of the paper (filename without extension)
+        data_folder: Path to the data folder containing papers
+        output_dir: Output directory for extracted content
+        resolution: Upper bound on the image resolution in DPI
+        max_pages: Maximum pages to process; all pages when None. Long
+            documents are extracted in full, and the page budget planner
+            (mydatasets/page_planner.py) picks what reaches each agent
+        max_chars_per_page: Maximum characters of text kept per page; no
+            limit when None
+        progress_callback: Optional callback(event, data), called after each page
+        pdf_bytes: PDF content already in memory; when given, the PDF is opened
+            from memory and data/<paper_name>/<paper_name>.pdf is not needed
+        workers: Number of render processes. With more than one, page ranges are
+            sharded across a process pool, each process opening its own copy of
+            the PDF; the output layout is the same as with a single process.
+        profiles: Render profiles (see scripts/render_profiles.py) rendered for
+            every page up front, each at the size its consumer needs. Other
+            profiles are rendered on demand from the PDF, which is kept in
+            the extraction directory
+        codec: Page image codec, one of IMAGE_CODECS (png, jpeg, webp)
+        quality: Encoder quality (1-100) for jpeg and webp
+        figures: Also extract embedded figures to figures/, deduplicated,
+            with bounding boxes and captions in figures.json
+        page_store: Pack page text and the up-front page images into a single
+            memory-mapped pages.bin (see scripts/page_store.py) instead of
+            keeping one image file per page
         
-        extraction_time = time.time() - start_time
+    Returns:
+        Dictionary containing extraction results
+    """
+    start_time = time.time()
+    extraction_dir = os.path.join(output_dir, paper_name)
+    num_pages = 0
+    
+    try:
+        # 逐页抽取，不需要流式结果时直接消费完生成器
+        for page in stream_paper(
+            paper_name, data_folder, output_dir, resolution, max_pages, progress_callback,
+            pdf_bytes, workers, profiles, codec, quality, image_profile=None, figures=figures,
+            page_store=page_store, max_chars_per_page=max_chars_per_page
+        ):
+            num_pages += 1
         
         # 返回提取信息
         return {
             "extraction_dir": extraction_dir,
-            "num_pages": page_count,
-            "extraction_time": extraction_time,
+            "num_pages": num_pages,
+            "extraction_time": time.time() - start_time,
+        }
+    
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        return {
+            "extraction_dir": None,
+            "num_pages": 0,
+            "extraction_time": time.time() - start_time,
+            "error": str(e)
         }
-        
     except Exception as e:
-        print(f"Error extracting PDF {pdf_path}: {e}")
+        print(f"Error extracting PDF {paper_name}: {e}")
         return {
             "extraction_dir": extraction_dir,
             "num_pages": 0,
@@ -158,9 +415,16 @@ def main():
     parser.add_argument("--paper_name", help="Name of the paper (without extension)")
     parser.add_argument("-d", "--data-folder", default="data", help="Path to the data folder containing papers")
     parser.add_argument("-o", "--output", default="data", help="Output directory")
-    parser.add_argument("-r", "--resolution", type=int, default=300, help="Image resolution in DPI")
-    parser.add_argument("-m", "--max-pages", type=int, default=30, help="Maximum pages to process")
-    parser.add_argument("-c", "--max-chars", type=int, default=4000, help="Maximum characters per page")
+    parser.add_argument("-r", "--resolution", type=int, default=300, help="Maximum image resolution in DPI")
+    parser.add_argument("-m", "--max-pages", type=int, default=None, help="Maximum pages to process (default: all)")
+    parser.add_argument("-c", "--max-chars", type=int, default=None, help="Maximum characters per page (default: no limit)")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Number of render processes")
+    parser.add_argument("-p", "--profiles", default=",".join(DEFAULT_PROFILES),
+                        help=f"Comma-separated render profiles ({', '.join(RENDER_PROFILES)})")
+    parser.add_argument("--codec", choices=list(IMAGE_CODECS), default="png", help="Page image codec")
+    parser.add_argument("-q", "--quality", type=int, default=None, help="JPEG/WebP quality (1-100)")
+    parser.add_argument("--figures", action="store_true", help="Also extract embedded figures with their captions")
+    parser.add_argument("--no-page-store", action="store_true", help="Keep page images as files instead of packing them into pages.bin")
     
     args = parser.parse_args()
     
@@ -170,7 +434,13 @@ def main():
         output_dir=args.output,
         resolution=args.resolution,
         max_pages=args.max_pages,
-        max_chars_per_page=args.max_chars
+        max_chars_per_page=args.max_chars,
+        workers=args.workers,
+        profiles=[name.strip() for name in args.profiles.split(",") if name.strip()],
+        codec=args.codec,
+        quality=args.quality,
+        figures=args.figures,
+        page_store=not args.no_page_store
     )
     
     print(f"Extraction completed:")
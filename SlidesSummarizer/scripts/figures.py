@@ -0,0 +1,182 @@
+"""
+Embedded figure extraction.
+
+With --figures, extract_paper also pulls the figures out of the PDF into
+figures/ and describes them in figures.json, so the image agent can look at
+tight figure crops instead of whole pages:
+
+    figures: [{id, file, page, bbox, width, height, source, xref, sha256,
+               caption_id, caption}]
+
+Raster figures are read from their image xref. An xref reused on several
+pages (logos, headers) and images with identical content are stored once.
+Images under MIN_FIGURE_PIXELS on a side or drawn smaller than
+MIN_FIGURE_POINTS are dropped as icons. Vector figures have no xref. For
+figure captions with no raster image, the drawings just above the caption
+are rendered as a crop (source "vector").
+"""
+
+import os
+import json
+import hashlib
+from typing import Any, Dict, List, Optional
+
+import fitz  # PyMuPDF
+
+from scripts.render_profiles import FITZ_LOCK, IMAGE_CODECS, RENDER_PROFILES, save_pixmap
+
+FIGURES_DIR = "figures"
+FIGURES_FILE = "figures.json"
+
+# 太小的图像可能是图标等，不是重要图表
+MIN_FIGURE_PIXELS = 100
+MIN_FIGURE_POINTS = 50
+# 图表标题与其图像之间允许的最大间距 (pt)
+MAX_CAPTION_GAP = 72
+
+
+def figure_filename(page_num: int, idx: int, codec: str = "png") -> str:
+    return f"{page_num:02d}_fig_{idx:02d}.{IMAGE_CODECS[codec]['ext']}"
+
+
+def _nearest_caption(bbox: "fitz.Rect", captions: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Figure caption right below (or else right above) a bbox on the same page"""
+    best, best_gap = None, MAX_CAPTION_GAP
+    for caption in captions:
+        top, bottom = caption["bbox"][1], caption["bbox"][3]
+        # 标题一般在图下方，偶尔在上方
+        gap = top - bbox.y1 if top >= bbox.y1 - 2 else bbox.y0 - bottom
+        if -2 <= gap < best_gap:
+            best, best_gap = caption, gap
+    return best
+
+
+def _vector_clip(page: "fitz.Page", caption: Dict[str, Any]) -> Optional["fitz.Rect"]:
+    """Bounding box of the drawings between a caption and the body paragraph above it"""
+    caption_rect = fitz.Rect(caption["bbox"])
+    # 图与标题之间可能有正文，只取标题上方到上一个正文块之间的区域
+    ceiling = page.rect.y0
+    for block in page.get_text("blocks"):
+        rect = fitz.Rect(block[:4])
+        if rect.y1 <= caption_rect.y0 - 2 and rect.x0 < caption_rect.x1 and rect.x1 > caption_rect.x0:
+            if rect.height > 0 and len(block[4]) > 200:  # 较长的正文段落
+                ceiling = max(ceiling, rect.y1)
+    clip = fitz.Rect()
+    for drawing in page.get_drawings():
+        rect = drawing["rect"]
+        if rect.y0 >= ceiling and rect.y1 <= caption_rect.y0 + 2:
+            clip |= rect
+    if clip.is_empty or clip.width < MIN_FIGURE_POINTS or clip.height < MIN_FIGURE_POINTS:
+        return None
+    return clip & page.rect
+
+
+def extract_figures(
+    pdf_document: "fitz.Document",
+    page_count: int,
+    extraction_dir: str,
+    structure: Dict[str, Any],
+    codec: str = "png",
+    quality: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Save the figures of the first page_count pages to
+    <extraction_dir>/figures/NN_fig_MM.<ext> and write figures.json.
+    structure is the content.json structure, used for captions.
+    Calls into PyMuPDF, so the caller holds FITZ_LOCK.
+    """
+    out_dir = os.path.join(extraction_dir, FIGURES_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    captions = [c for c in structure.get("captions", []) if c["kind"] == "figure"]
+    seen_xrefs, seen_hashes = set(), set()
+    figures: List[Dict[str, Any]] = []
+    dpi = RENDER_PROFILES["hires"]["dpi"]
+
+    for page_idx in range(page_count):
+        page = pdf_document[page_idx]
+        page_num = page_idx + 1
+        page_captions = [c for c in captions if c["page"] == page_num]
+        captioned = set()
+        idx = 0
+
+        def add(pixmap, bbox, source, xref=None, digest=None, caption=None):
+            nonlocal idx
+            idx += 1
+            if caption is None:
+                caption = _nearest_caption(bbox, [c for c in page_captions if c["id"] not in captioned])
+            if caption is not None:
+                captioned.add(caption["id"])
+            file_name = figure_filename(page_num, idx, codec)
+            save_pixmap(pixmap, os.path.join(out_dir, file_name), codec, quality)
+            figures.append({
+                "id": len(figures),
+                "file": os.path.join(FIGURES_DIR, file_name),
+                "page": page_num,
+                "bbox": [round(v, 1) for v in bbox],
+                "width": pixmap.width,
+                "height": pixmap.height,
+                "source": source,
+                "xref": xref,
+                "sha256": digest,
+                "caption_id": caption["id"] if caption else None,
+                "caption": caption["text"] if caption else None,
+            })
+
+        # 提取页面上的内嵌图像
+        for img_info in page.get_images(full=True):
+            xref, width, height = img_info[0], img_info[2], img_info[3]
+            if xref in seen_xrefs:
+                continue
+            seen_xrefs.add(xref)
+            if width < MIN_FIGURE_PIXELS or height < MIN_FIGURE_PIXELS:
+                continue
+            rects = page.get_image_rects(xref)
+            if not rects:
+                continue
+            bbox = rects[0]
+            if bbox.width < MIN_FIGURE_POINTS or bbox.height < MIN_FIGURE_POINTS:
+                continue
+            try:
+                digest = hashlib.sha256(pdf_document.xref_stream_raw(xref)).hexdigest()
+                if digest in seen_hashes:
+                    continue
+                seen_hashes.add(digest)
+                pixmap = fitz.Pixmap(pdf_document, xref)
+                if pixmap.colorspace is None or pixmap.colorspace.n != 3:
+                    pixmap = fitz.Pixmap(fitz.csRGB, pixmap)
+                if pixmap.alpha:
+                    pixmap = fitz.Pixmap(pixmap, 0)
+                add(pixmap, bbox, "embedded", xref, digest)
+            except Exception as e:
+                print(f"Error extracting image {xref} from page {page_num}: {e}")
+
+        # 矢量图没有 xref，按标题上方的绘图区域裁剪渲染
+        for caption in page_captions:
+            if caption["id"] in captioned:
+                continue
+            clip = _vector_clip(page, caption)
+            if clip is None:
+                continue
+            zoom = dpi / 72
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+            add(pixmap, clip, "vector", caption=caption)
+
+    with open(os.path.join(extraction_dir, FIGURES_FILE), "w", encoding="utf-8") as f:
+        json.dump({"figures": figures}, f, ensure_ascii=False, indent=2)
+    return figures
+
+
+def extract_pdf_figures(
+    pdf_path: str,
+    extraction_dir: str,
+    structure: Dict[str, Any],
+    codec: str = "png",
+    quality: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """extract_figures over every page of the PDF at pdf_path, under FITZ_LOCK"""
+    with FITZ_LOCK:
+        pdf_document = fitz.open(pdf_path)
+        try:
+            return extract_figures(pdf_document, len(pdf_document), extraction_dir, structure, codec, quality)
+        finally:
+            pdf_document.close()
@@ -0,0 +1,220 @@
+"""
+Layout-aware text structure.
+
+page_layout() reads one page with PyMuPDF's "dict" output and keeps each text
+line with its font size, boldness and bounding box, plus the tables on pages
+that have a table caption. build_structure() then runs over all pages and
+stores an indexed structure in content.json next to the flat per-page text:
+
+    abstract:   text of the abstract
+    sections:   [{id, title, number, level, page_start, page_end, text}]
+    captions:   [{id, kind, label, page, bbox, text}]  (kind is figure or table)
+    tables:     [{id, page, bbox, caption_id, rows}]
+    references: [reference entry text]
+
+Headings are recognized by numbering ("3", "3.2", "III.") or a known section
+name, set larger or bolder than the body text.
+"""
+
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import fitz  # PyMuPDF
+
+# 常见的无编号章节标题
+KNOWN_SECTIONS = {
+    "abstract", "introduction", "related work", "related works", "background", "method", "methods",
+    "methodology", "approach", "experiments", "experimental results", "results", "evaluation",
+    "discussion", "conclusion", "conclusions", "limitations", "acknowledgments", "acknowledgements",
+    "references", "bibliography", "appendix", "supplementary material",
+}
+REFERENCE_SECTIONS = {"references", "bibliography"}
+
+# "3", "3.2", "III." or appendix "A." / "A.1"
+HEADING_NUMBER = re.compile(r"^((?:\d+\.)*\d+\.?|[IVX]+\.|[A-Z]\.(?:\d+\.?)*)\s+(\S.*)$")
+CAPTION = re.compile(r"^(Figure|Fig\.|Table)\s*(\d+|[IVX]+)\s*[.:|]", re.IGNORECASE)
+
+MAX_HEADING_CHARS = 80
+BOLD_FLAG = 16  # span flags bit for bold text
+
+
+def page_layout(page: "fitz.Page") -> Dict[str, Any]:
+    """
+    Text lines of a page with their font and position, and the tables on it
+    when the page has a table caption (table detection is slow).
+    """
+    lines = []
+    for block in page.get_text("dict")["blocks"]:
+        if block.get("type") != 0:
+            continue
+        for line in block["lines"]:
+            spans = [span for span in line["spans"] if span["text"].strip()]
+            if not spans:
+                continue
+            text = " ".join(span["text"].strip() for span in spans)
+            chars = sum(len(span["text"]) for span in spans)
+            lines.append({
+                "text": text,
+                "size": round(sum(span["size"] * len(span["text"]) for span in spans) / chars, 1),
+                "bold": all(span["flags"] & BOLD_FLAG or "Bold" in span["font"] for span in spans),
+                "bbox": [round(v, 1) for v in line["bbox"]],
+                "block": block["number"],
+            })
+
+    tables = []
+    if any(CAPTION.match(line["text"]) and line["text"].lower().startswith("tab") for line in lines):
+        try:
+            for table in page.find_tables().tables:
+                tables.append({
+                    "bbox": [round(v, 1) for v in table.bbox],
+                    "rows": [[cell or "" for cell in row] for row in table.extract()],
+                })
+        except Exception as e:  # find_tables needs PyMuPDF >= 1.23
+            print(f"Table detection failed on page {page.number + 1}: {e}")
+    return {"lines": lines, "tables": tables}
+
+
+def _body_size(layouts: Dict[int, Dict[str, Any]]) -> float:
+    """Most common font size, weighted by characters"""
+    sizes = Counter()
+    for layout in layouts.values():
+        for line in layout["lines"]:
+            sizes[line["size"]] += len(line["text"])
+    return sizes.most_common(1)[0][0] if sizes else 0.0
+
+
+def _heading(line: Dict[str, Any], body_size: float) -> Optional[Dict[str, Any]]:
+    """number, title and level if the line looks like a section heading"""
+    text = line["text"].strip()
+    if len(text) > MAX_HEADING_CHARS or CAPTION.match(text):
+        return None
+    emphasized = line["bold"] or line["size"] >= body_size + 1
+    if not emphasized:
+        return None
+    name = text.rstrip(".:").lower()
+    if name in KNOWN_SECTIONS:
+        return {"number": None, "title": text.rstrip(".:"), "level": 1}
+    match = HEADING_NUMBER.match(text)
+    if match and not text.rstrip().endswith(".") and match.group(2)[:1].isupper():
+        number = match.group(1).rstrip(".")
+        return {"number": number, "title": text, "level": number.count(".") + 1}
+    return None
+
+
+def build_structure(layouts: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Build the indexed text structure from page_layout() results keyed by
+    1-based page number.
+    """
+    body_size = _body_size(layouts)
+    sections: List[Dict[str, Any]] = []
+    captions: List[Dict[str, Any]] = []
+    tables: List[Dict[str, Any]] = []
+    current: Optional[Dict[str, Any]] = None
+    caption: Optional[Dict[str, Any]] = None
+
+    for page_num in sorted(layouts):
+        layout = layouts[page_num]
+        for line in layout["lines"]:
+            heading = _heading(line, body_size)
+            if heading is not None:
+                current = {"id": len(sections), **heading, "page_start": page_num, "page_end": page_num, "lines": []}
+                sections.append(current)
+                caption = None
+                continue
+
+            match = CAPTION.match(line["text"])
+            if match:
+                kind = "table" if match.group(1).lower().startswith("tab") else "figure"
+                caption = {
+                    "id": len(captions),
+                    "kind": kind,
+                    "label": f"{kind.capitalize()} {match.group(2)}",
+                    "page": page_num,
+                    "bbox": list(line["bbox"]),
+                    "text": line["text"],
+                    "block": line["block"],
+                }
+                captions.append(caption)
+                continue
+            if caption is not None and caption["page"] == page_num and caption["block"] == line["block"]:
+                # 同一文本块中的后续行属于图表标题
+                caption["text"] += " " + line["text"]
+                caption["bbox"] = [
+                    min(caption["bbox"][0], line["bbox"][0]), min(caption["bbox"][1], line["bbox"][1]),
+                    max(caption["bbox"][2], line["bbox"][2]), max(caption["bbox"][3], line["bbox"][3]),
+                ]
+                continue
+            caption = None
+
+            if current is None:
+                # 第一个标题之前的内容 (题目、作者等)
+                current = {"id": 0, "number": None, "title": "", "level": 0,
+                           "page_start": page_num, "page_end": page_num, "lines": []}
+                sections.append(current)
+            current["lines"].append(line["text"])
+            current["page_end"] = page_num
+
+        for table in layout["tables"]:
+            # 表格标题通常紧挨在表格上方或下方
+            candidates = [c for c in captions if c["kind"] == "table" and c["page"] == page_num]
+            nearest = min(
+                candidates,
+                key=lambda c: min(abs(c["bbox"][3] - table["bbox"][1]), abs(c["bbox"][1] - table["bbox"][3])),
+                default=None,
+            )
+            tables.append({
+                "id": len(tables),
+                "page": page_num,
+                "bbox": table["bbox"],
+                "caption_id": nearest["id"] if nearest else None,
+                "rows": table["rows"],
+            })
+
+    for section in sections:
+        section["text"] = _join_lines(section.pop("lines"))
+    for caption in captions:
+        caption.pop("block")
+
+    abstract = ""
+    references: List[str] = []
+    for section in sections:
+        name = section["title"].lower()
+        if name == "abstract" and not abstract:
+            abstract = section["text"]
+        elif name in REFERENCE_SECTIONS:
+            references = _split_references(section["text"])
+    if not abstract and sections and sections[0]["level"] == 0:
+        # 摘要没有单独的标题行，而是以 "Abstract" 开头的段落
+        text = sections[0]["text"]
+        idx = text.lower().find("abstract")
+        if idx >= 0:
+            abstract = text[idx + len("abstract"):].lstrip(" .:—-")
+
+    return {
+        "abstract": abstract,
+        "sections": sections,
+        "captions": captions,
+        "tables": tables,
+        "references": references,
+    }
+
+
+def _join_lines(lines: List[str]) -> str:
+    """Join text lines, undoing end-of-line hyphenation"""
+    text = ""
+    for line in lines:
+        if text.endswith("-") and line[:1].islower():
+            text = text[:-1] + line
+        else:
+            text = f"{text} {line}" if text else line
+    return text
+
+
+def _split_references(text: str) -> List[str]:
+    """Split a reference list into entries on [n] or n. markers"""
+    parts = re.split(r"\s(?=\[\d+\]\s)", text)
+    if len(parts) <= 1:
+        parts = re.split(r"\s(?=\d{1,3}\.\s+[A-Z])", text)
+    return [part.strip() for part in parts if part.strip()]
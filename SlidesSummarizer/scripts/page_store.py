@@ -0,0 +1,162 @@
+"""
+Single-file page store.
+
+extract_paper packs each paper into <paper_dir>/pages.bin: the text of every
+page and the page images rendered up front (the ColPali thumbnails), in place
+of one image file per page. The file is read through mmap, so a page's text
+or image is a slice of the mapping, found in O(1) from the index:
+
+    MAGIC | page text and image blobs ... | index (JSON) | footer
+
+The footer holds the index offset and length followed by MAGIC again. The
+index maps page numbers to (offset, length) of their text and of each
+profile's image, with the image file name, and holds the paper title and
+text structure. content.json is still written next to it for readers that
+do not know the store.
+"""
+
+import io
+import os
+import json
+import mmap
+import struct
+from typing import Any, Dict, List, Optional
+
+MAGIC = b"TLDRPGS1"
+FOOTER = struct.Struct("<QQ8s")  # index offset, index length, MAGIC
+PAGE_STORE_FILE = "pages.bin"
+
+
+def page_store_path(paper_dir: str) -> str:
+    return os.path.join(paper_dir, PAGE_STORE_FILE)
+
+
+class PageStoreWriter:
+    """
+    Writes a page store under a temporary name and moves it into place on
+    close(), so readers never see a partial store.
+
+    Args:
+        path: Store file path
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self._file = open(self.tmp_path, "wb")
+        self._file.write(MAGIC)
+        self._pages: Dict[str, Dict[str, Any]] = {}
+
+    def _append(self, data: bytes) -> List[int]:
+        offset = self._file.tell()
+        self._file.write(data)
+        return [offset, len(data)]
+
+    def add_page(self, page_num: int, text: str, images: Optional[Dict[str, str]] = None) -> None:
+        """
+        Add a page's text and images; images maps profile names to image
+        files, which are copied into the store
+        """
+        entry: Dict[str, Any] = {"text": self._append(text.encode("utf-8")), "images": {}}
+        for profile_name, image_path in (images or {}).items():
+            with open(image_path, "rb") as f:
+                entry["images"][profile_name] = self._append(f.read()) + [os.path.basename(image_path)]
+        self._pages[str(page_num)] = entry
+
+    def close(self, title: str = "", structure: Optional[Dict[str, Any]] = None) -> None:
+        index = json.dumps(
+            {"version": 1, "title": title, "structure": structure or {}, "pages": self._pages},
+            ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+        offset, length = self._append(index)
+        self._file.write(FOOTER.pack(offset, length, MAGIC))
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self) -> None:
+        self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+
+class PageStore:
+    """
+    Read-only, memory-mapped page store.
+
+    Args:
+        path: Store file path
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        offset, length, magic = FOOTER.unpack_from(self._mmap, len(self._mmap) - FOOTER.size)
+        if self._mmap[:len(MAGIC)] != MAGIC or magic != MAGIC:
+            self.close()
+            raise ValueError(f"Not a page store: {path}")
+        self.index = json.loads(self._view[offset:offset + length].tobytes())
+        self._pages = self.index["pages"]
+
+    @property
+    def title(self) -> str:
+        return self.index.get("title", "")
+
+    @property
+    def structure(self) -> Dict[str, Any]:
+        return self.index.get("structure") or {}
+
+    def page_nums(self) -> List[int]:
+        return sorted(int(page_num) for page_num in self._pages)
+
+    def text(self, page_num: int) -> str:
+        offset, length = self._pages[str(page_num)]["text"]
+        return str(self._view[offset:offset + length], "utf-8")
+
+    def image(self, page_num: int, profile_name: str) -> Optional[memoryview]:
+        """Encoded image bytes of a page, a zero-copy slice of the store"""
+        entry = self._pages[str(page_num)]["images"].get(profile_name)
+        if entry is None:
+            return None
+        offset, length, _ = entry
+        return self._view[offset:offset + length]
+
+    def image_name(self, page_num: int, profile_name: str) -> Optional[str]:
+        """File name the image had before it was packed (NN_page.<ext>)"""
+        entry = self._pages[str(page_num)]["images"].get(profile_name)
+        return entry[2] if entry else None
+
+    def open_image(self, page_num: int, profile_name: str):
+        """Decode a page image with PIL, or None if the profile is not stored"""
+        from PIL import Image
+
+        data = self.image(page_num, profile_name)
+        if data is None:
+            return None
+        return Image.open(io.BytesIO(data))
+
+    def content(self) -> Dict[str, Any]:
+        """The same dictionary as content.json"""
+        return {
+            "title": self.title,
+            "pages": [{"page_num": page_num, "text": self.text(page_num)} for page_num in self.page_nums()],
+            "structure": self.structure,
+        }
+
+    def close(self) -> None:
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # slices handed out by image() are still alive; the mapping is
+            # released when they are garbage collected
+            pass
+
+    def __enter__(self) -> "PageStore":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
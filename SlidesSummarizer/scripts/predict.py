@@ -7,14 +7,11 @@ import hydra
 from omegaconf import DictConfig
 import json
 
-@hydra.main(config_path="../config", config_name="base", version_base="1.2")
-def main(cfg: DictConfig):
-    # 从命令行获取paper_name参数
-    #if not hasattr(cfg, "paper_name"):
-    #    raise ValueError("Missing required parameter: paper_name. Use paper_name=YOUR_PAPER_NAME")
-    
-    os.environ["CUDA_VISIBLE_DEVICES"] = cfg.cuda_visible_devices
-    os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "max_split_size_mb:64"
+def resolve_agent_configs(cfg: DictConfig) -> DictConfig:
+    """
+    Replace the agent/model names in cfg with their composed configs.
+    Requires an initialized Hydra (hydra.main or initialize_config_dir).
+    """
     for agent_config in cfg.agents:
         agent_name = agent_config.agent
         model_name = agent_config.model
@@ -25,6 +22,17 @@ def main(cfg: DictConfig):
     
     cfg.sum_agent.agent = hydra.compose(config_name="agent/"+cfg.sum_agent.agent, overrides=[]).agent
     cfg.sum_agent.model = hydra.compose(config_name="model/"+cfg.sum_agent.model, overrides=[]).model
+    return cfg
+
+@hydra.main(config_path="../config", config_name="base", version_base="1.2")
+def main(cfg: DictConfig):
+    # 从命令行获取paper_name参数
+    #if not hasattr(cfg, "paper_name"):
+    #    raise ValueError("Missing required parameter: paper_name. Use paper_name=YOUR_PAPER_NAME")
+    
+    os.environ["CUDA_VISIBLE_DEVICES"] = cfg.cuda_visible_devices
+    os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "max_split_size_mb:64"
+    resolve_agent_configs(cfg)
     
     # Initialize dataset with paper_name from cfg
     dataset = BaseDataset(cfg.paper_name)
@@ -0,0 +1,139 @@
+"""
+Page render profiles.
+
+Each consumer of page images declares the size it actually uses, and pages are
+rasterized at that size directly instead of at a fixed 300 DPI:
+
+    retrieval: ColPali thumbnails in thumbs/ (ColPali resizes to 448x448)
+    vlm:       VLM input in images/, within the Qwen2-VL pixel budget
+    hires:     300 DPI renders in hires/, cropped to the page content, used
+               for pages picked by retrieval
+
+All profiles write <dir>/NN_page.<ext>, so page names are shared between them.
+The image codec (PNG, JPEG or WebP, with a quality for the lossy ones) is
+chosen independently of the profile; see IMAGE_CODECS.
+Only the retrieval profile is rendered for every page during extraction;
+BaseDataset renders the others on demand (see mydatasets/page_images.py).
+"""
+
+import os
+import math
+import threading
+from typing import Any, Dict, Optional
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from scripts.page_store import page_store_path
+
+RENDER_PROFILES: Dict[str, Dict[str, Any]] = {
+    # 短边 448 像素，ColPali 会再缩放到 448x448
+    "retrieval": {"dir": "thumbs", "min_side": 448},
+    # Qwen2-VL 按 28x28 的 patch 计费，与 models/qwen.py 中的 max_pixels 一致
+    "vlm": {"dir": "images", "max_pixels": 2048 * 28 * 28},
+    # 检索到的页面：300 DPI，裁掉页边空白
+    "hires": {"dir": "hires", "dpi": 300, "crop": True},
+}
+
+# 抽取阶段为所有页面渲染的 profile；vlm / hires 由 BaseDataset 按需渲染
+DEFAULT_PROFILES = ("retrieval",)
+
+# 页面图片编码格式: PNG 无损但编码慢、文件大; JPEG / WebP 可调 quality
+IMAGE_CODECS: Dict[str, Dict[str, str]] = {
+    "png": {"ext": "png", "mime": "image/png", "pil_format": "PNG"},
+    "jpeg": {"ext": "jpg", "mime": "image/jpeg", "pil_format": "JPEG"},
+    "webp": {"ext": "webp", "mime": "image/webp", "pil_format": "WEBP"},
+}
+DEFAULT_QUALITY = 85
+
+# PyMuPDF 不是线程安全的，同一进程内的渲染需串行
+FITZ_LOCK = threading.RLock()
+
+
+def page_filename(page_num: int, codec: str = "png") -> str:
+    return f"{page_num:02d}_page.{IMAGE_CODECS[codec]['ext']}"
+
+
+def save_pixmap(pixmap: "fitz.Pixmap", image_path: str, codec: str = "png", quality: Optional[int] = None) -> None:
+    """Encode a pixmap with a codec; quality (1-100) only applies to JPEG and WebP"""
+    if codec == "png":
+        pixmap.save(image_path, output="png")
+        return
+    image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    image.save(image_path, format=IMAGE_CODECS[codec]["pil_format"], quality=quality or DEFAULT_QUALITY)
+
+
+def profile_dir(paper_dir: str, profile_name: str) -> str:
+    return os.path.join(paper_dir, RENDER_PROFILES[profile_name]["dir"])
+
+
+def image_dir_for(paper_dir: str, profile_name: str) -> str:
+    """
+    Directory holding a profile's page images. Papers extracted before render
+    profiles existed only have images/ at 300 DPI, which is used as fallback.
+    Images packed into pages.bin (scripts/page_store.py) keep their directory
+    name, although the directory itself is gone.
+    """
+    path = profile_dir(paper_dir, profile_name)
+    if os.path.isdir(path) or os.path.exists(page_store_path(paper_dir)):
+        return path
+    return os.path.join(paper_dir, "images")
+
+
+def content_clip(page: "fitz.Page", margin: float = 12) -> "fitz.Rect":
+    """Bounding box of everything drawn on the page plus a small margin"""
+    bbox = fitz.Rect()
+    for block in page.get_text("blocks"):
+        bbox |= fitz.Rect(block[:4])
+    for info in page.get_image_info():
+        bbox |= fitz.Rect(info["bbox"])
+    for drawing in page.get_drawings():
+        bbox |= drawing["rect"]
+    if bbox.is_empty or bbox.is_infinite:
+        return page.rect
+    bbox = fitz.Rect(bbox.x0 - margin, bbox.y0 - margin, bbox.x1 + margin, bbox.y1 + margin)
+    return bbox & page.rect
+
+
+def profile_zoom(rect: "fitz.Rect", profile: Dict[str, Any], max_dpi: int = 300) -> float:
+    """Scale factor from PDF points to pixels for a profile, never above max_dpi"""
+    if "min_side" in profile:
+        zoom = profile["min_side"] / min(rect.width, rect.height)
+    elif "max_pixels" in profile:
+        zoom = math.sqrt(profile["max_pixels"] / (rect.width * rect.height))
+    else:
+        zoom = profile.get("dpi", max_dpi) / 72
+    return min(zoom, max_dpi / 72)
+
+
+def render_page(
+    page: "fitz.Page",
+    page_num: int,
+    paper_dir: str,
+    profile_name: str,
+    max_dpi: int = 300,
+    profile: Optional[Dict[str, Any]] = None,
+    image_path: Optional[str] = None,
+    codec: str = "png",
+    quality: Optional[int] = None
+) -> str:
+    """
+    Render one page with a profile to <paper_dir>/<profile dir>/NN_page.<ext>,
+    or to image_path when given.
+    """
+    profile = profile or RENDER_PROFILES[profile_name]
+    clip = content_clip(page) if profile.get("crop") else page.rect
+    zoom = profile_zoom(clip, profile, max_dpi)
+    if image_path is None:
+        out_dir = os.path.join(paper_dir, profile["dir"])
+        os.makedirs(out_dir, exist_ok=True)
+        image_path = os.path.join(out_dir, page_filename(page_num, codec))
+    pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+    save_pixmap(pixmap, image_path, codec, quality)
+    return image_path
+
+
+def page_num_from_name(name: str) -> Optional[int]:
+    """Page number from an NN_page.<ext> file name"""
+    prefix = name.split("_", 1)[0]
+    return int(prefix) if prefix.isdigit() else None
@@ -6,6 +6,8 @@ import argparse
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from retrieval.image_retrieval import ImageRetrieval
+from scripts.page_store import page_store_path
+from scripts.render_profiles import image_dir_for
 
 
 def main():
@@ -19,11 +21,11 @@ def main():
     
     args = parser.parse_args()
 
-    image_dir = os.path.join(args.base_dir, args.paper_name, "images")
+    image_dir = image_dir_for(os.path.join(args.base_dir, args.paper_name), ImageRetrieval.render_profile)
     output_dir = os.path.join(args.base_dir, args.paper_name, "retrieval")
 
-    # 检查目录是否存在
-    if not os.path.exists(image_dir):
+    # 检查目录是否存在 (或页面图像已打包进 pages.bin)
+    if not os.path.exists(image_dir) and not os.path.exists(page_store_path(os.path.dirname(image_dir))):
         print(f"Image directory {image_dir} does not exist")
         return
     
@@ -0,0 +1,38 @@
+import os
+import sys
+import argparse
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from retrieval.image_retrieval import ImageRetrieval
+from retrieval.library_retrieval import LibraryRetrieval
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="Search page images across every paper in the data folder")
+    parser.add_argument("--base_dir", default="data", help="Base directory")
+    parser.add_argument("--query", action="append", required=True,
+                        help="Free-text query, e.g. \"transformer architecture diagram\"; may be repeated")
+    parser.add_argument("--top_k", type=int, default=5, help="Number of pages to return per query")
+    parser.add_argument("--paper_name", action="append", help="Restrict the search to these papers; may be repeated")
+    parser.add_argument("--pool_factor", type=int, default=4, help="Page tokens per pooled vector in the library index")
+    parser.add_argument("--candidates", type=int, default=100, help="Pages reranked with exact MaxSim")
+
+    args = parser.parse_args()
+
+    retriever = ImageRetrieval()
+    library = LibraryRetrieval(retriever, args.base_dir, {"pool_factor": args.pool_factor, "candidates": args.candidates})
+    # 只嵌入新增或变化的论文
+    library.prepare_documents()
+
+    documents = [{"paper_name": name} for name in args.paper_name] if args.paper_name else None
+    for query in args.query:
+        print(f"\nQuery: {query}")
+        for i, result in enumerate(library.retrieve(query, documents, args.top_k)):
+            print(f"{i+1}. {result['paper_name']}/{result['page_name']} (Score: {result['score']:.4f})")
+
+
+if __name__ == "__main__":
+    main()
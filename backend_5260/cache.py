@@ -0,0 +1,197 @@
+"""
+Content-addressed cache for paper summaries.
+
+Papers are keyed by the SHA-256 of the PDF bytes instead of the upload
+filename. Stage artifacts (PDF, content.json, page images, retrieval JSON)
+only depend on the PDF and live in SlidesSummarizer/data/<pdf_key>/, so they
+are reused when only the model configuration changes. Final summaries depend
+on the agent/model configuration as well and are stored separately under
+<root>/summaries/<pdf_key>/<config_fingerprint>.json.
+
+Generated decks are cached the same way under <root>/decks/<deck_key>.pptx,
+keyed on the canonical JSON of the slide content plus a hash of the theme
+directory, so editing a theme invalidates its decks.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from omegaconf import DictConfig, OmegaConf
+
+# config keys that do not change the output (and must not end up on disk)
+FINGERPRINT_EXCLUDED_KEYS = {"api_key"}
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_bytes(data: bytes) -> str:
+    """SHA-256 hex digest of in-memory content"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_directory(path: str) -> str:
+    """SHA-256 over the relative paths and contents of every file below a directory"""
+    digest = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            file_path = os.path.join(dirpath, filename)
+            digest.update(os.path.relpath(file_path, path).replace(os.sep, "/").encode("utf-8"))
+            digest.update(hash_file(file_path).encode("ascii"))
+    return digest.hexdigest()
+
+
+def _directory_signature(path: str) -> Tuple:
+    """Cheap (name, size, mtime) listing used to detect theme changes without rehashing"""
+    signature = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            stat = os.stat(os.path.join(dirpath, filename))
+            signature.append((os.path.join(dirpath, filename), stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+def canonical_json(obj: Any) -> str:
+    """JSON with sorted keys and no insignificant whitespace"""
+    return json.dumps(obj, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _strip_keys(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {k: _strip_keys(v) for k, v in obj.items() if k not in FINGERPRINT_EXCLUDED_KEYS}
+    if isinstance(obj, list):
+        return [_strip_keys(v) for v in obj]
+    return obj
+
+
+def config_fingerprint(cfg: DictConfig, extra: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Short hash of everything in the resolved config that affects the summary:
+    the agents (prompts, text/image switches) and their models, plus any
+    extra settings (e.g. how page images are rendered for the agents).
+    """
+    relevant = {
+        "agents": OmegaConf.to_container(cfg.agents, resolve=True),
+        "sum_agent": OmegaConf.to_container(cfg.sum_agent, resolve=True),
+    }
+    if extra:
+        relevant["extra"] = extra
+    canonical = json.dumps(_strip_keys(relevant), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class ResultCache:
+    """
+    Args:
+        root: Directory holding cached summaries
+        data_folder: SlidesSummarizer data folder holding per-paper stage artifacts
+    """
+
+    def __init__(self, root: str, data_folder: str):
+        self.root = root
+        self.data_folder = data_folder
+        os.makedirs(os.path.join(self.root, "summaries"), exist_ok=True)
+
+    def stage_dir(self, pdf_key: str) -> str:
+        """Paper folder for the PDF, usable as BaseDataset(pdf_key, data_folder)"""
+        return os.path.join(self.data_folder, pdf_key)
+
+    def summary_path(self, pdf_key: str, fingerprint: str) -> str:
+        return os.path.join(self.root, "summaries", pdf_key, f"{fingerprint}.json")
+
+    def get_summary(self, pdf_key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Return the cached summary dict, or None on a miss"""
+        path = self.summary_path(pdf_key, fingerprint)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                summary = json.load(f)
+            # refresh the entry's mtime so LRU eviction sees it as recently used
+            os.utime(os.path.dirname(path))
+            return summary
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[WARN] Ignoring unreadable cache entry {path}: {e}")
+            return None
+
+    def put_summary(self, pdf_key: str, fingerprint: str, summary: Dict[str, Any]) -> str:
+        """Write the summary atomically so readers never see a partial file"""
+        path = self.summary_path(pdf_key, fingerprint)
+        _write_atomic(path, json.dumps(summary, ensure_ascii=False, indent=2).encode("utf-8"))
+        return path
+
+
+class DeckCache:
+    """
+    Args:
+        root: Directory holding cached decks
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.join(root, "decks")
+        os.makedirs(self.root, exist_ok=True)
+        # theme path -> (directory signature, content hash)
+        self._theme_hashes: Dict[str, Tuple[Tuple, str]] = {}
+        self._lock = threading.Lock()
+
+    def theme_hash(self, theme_path: str) -> str:
+        """Content hash of a theme directory, recomputed only when its files change"""
+        signature = _directory_signature(theme_path)
+        with self._lock:
+            cached = self._theme_hashes.get(theme_path)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+        theme_hash = hash_directory(theme_path)
+        with self._lock:
+            self._theme_hashes[theme_path] = (signature, theme_hash)
+        return theme_hash
+
+    def deck_key(self, ppt_data: Dict[str, Any], theme_path: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(canonical_json(ppt_data).encode("utf-8"))
+        digest.update(self.theme_hash(theme_path).encode("ascii"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def seed(deck_key: str) -> int:
+        """Background seed derived from the key, so a rebuilt deck matches the cached one"""
+        return int(deck_key[:16], 16)
+
+    def deck_path(self, deck_key: str) -> str:
+        return os.path.join(self.root, f"{deck_key}.pptx")
+
+    def get(self, deck_key: str) -> Optional[bytes]:
+        """Return the cached PPTX bytes, or None on a miss"""
+        path = self.deck_path(deck_key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def put(self, deck_key: str, data: bytes) -> str:
+        path = self.deck_path(deck_key)
+        _write_atomic(path, data)
+        return path
@@ -0,0 +1,208 @@
+"""
+Retention and disk quota manager for backend artifacts.
+
+Each artifact class (uploaded files, per-paper intermediates under
+SlidesSummarizer/data, cached summaries) has its own root directory, TTL and
+byte budget. A background thread periodically removes entries older than the
+TTL and then evicts the least recently used entries until the class fits its
+budget. Summaries are a separate class from intermediates, so evicting a
+paper's page images never invalidates its cached summary.
+
+Entries are the direct children of a class root (a file or a whole directory).
+"Last used" is the entry's mtime; callers refresh it with touch(), and pin
+entries that a running job is reading or writing so they are never evicted.
+"""
+
+import os
+import re
+import time
+import shutil
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+@dataclass
+class ArtifactPolicy:
+    """
+    Args:
+        name: Artifact class name used in stats
+        root: Directory whose direct children are the managed entries
+        max_bytes: Byte budget for the class (None for unlimited)
+        ttl_seconds: Entries unused for longer than this are removed (None to keep)
+        entry_filter: Only entries whose name passes the filter are managed
+    """
+    name: str
+    root: str
+    max_bytes: Optional[int] = None
+    ttl_seconds: Optional[float] = None
+    entry_filter: Optional[Callable[[str], bool]] = None
+
+
+@dataclass
+class ArtifactStats:
+    current_bytes: int = 0
+    current_entries: int = 0
+    bytes_reclaimed: int = 0
+    entries_evicted: int = 0
+    last_run: Optional[float] = None
+    errors: List[str] = field(default_factory=list)
+
+
+_SHA256_HEX = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_content_key(name: str) -> bool:
+    """Entry names produced by the content-addressed cache (SHA-256 hex)"""
+    return bool(_SHA256_HEX.match(name))
+
+
+def entry_size(path: str) -> int:
+    """Size in bytes of a file or of everything below a directory"""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+class Janitor:
+    """
+    Args:
+        policies: One ArtifactPolicy per artifact class
+        interval: Seconds between sweeps of the background thread
+        min_age: Entries modified more recently than this are never evicted,
+            which protects files still being written by code that does not pin
+    """
+
+    def __init__(self, policies: List[ArtifactPolicy], interval: float = 300, min_age: float = 600):
+        self.policies = policies
+        self.interval = interval
+        self.min_age = min_age
+        self.stats: Dict[str, ArtifactStats] = {policy.name: ArtifactStats() for policy in policies}
+        self._pinned: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="janitor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"[WARN] Janitor sweep failed: {e}")
+
+    @staticmethod
+    def touch(path: str) -> None:
+        """Mark an entry as recently used"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    @contextmanager
+    def pinned(self, *paths: str):
+        """Protect entries from eviction while a job uses them"""
+        keys = [os.path.abspath(path) for path in paths]
+        with self._lock:
+            for key in keys:
+                self._pinned[key] = self._pinned.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                for key in keys:
+                    self._pinned[key] -= 1
+                    if self._pinned[key] == 0:
+                        del self._pinned[key]
+            for path in paths:
+                self.touch(path)
+
+    def _is_pinned(self, path: str) -> bool:
+        with self._lock:
+            return os.path.abspath(path) in self._pinned
+
+    def _list_entries(self, policy: ArtifactPolicy) -> List[Tuple[str, int, float]]:
+        """(path, size, last_used) for every managed entry of a class"""
+        entries = []
+        if not os.path.isdir(policy.root):
+            return entries
+        with os.scandir(policy.root) as it:
+            for entry in it:
+                if policy.entry_filter and not policy.entry_filter(entry.name):
+                    continue
+                try:
+                    entries.append((entry.path, entry_size(entry.path), entry.stat().st_mtime))
+                except OSError:
+                    continue
+        return entries
+
+    def _evict(self, path: str, size: int, stats: ArtifactStats) -> None:
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except OSError as e:
+            stats.errors = (stats.errors + [f"{path}: {e}"])[-10:]
+            return
+        stats.bytes_reclaimed += size
+        stats.entries_evicted += 1
+
+    def sweep(self) -> Dict[str, ArtifactStats]:
+        """Apply TTL and byte budget to every class once"""
+        now = time.time()
+        for policy in self.policies:
+            stats = self.stats[policy.name]
+            entries = self._list_entries(policy)
+            kept = []
+            for path, size, last_used in entries:
+                evictable = now - last_used >= self.min_age and not self._is_pinned(path)
+                if evictable and policy.ttl_seconds is not None and now - last_used > policy.ttl_seconds:
+                    self._evict(path, size, stats)
+                else:
+                    kept.append((path, size, last_used, evictable))
+
+            total = sum(size for _, size, _, _ in kept)
+            if policy.max_bytes is not None and total > policy.max_bytes:
+                # least recently used first
+                for path, size, last_used, evictable in sorted(kept, key=lambda e: e[2]):
+                    if total <= policy.max_bytes:
+                        break
+                    if not evictable:
+                        continue
+                    self._evict(path, size, stats)
+                    if not os.path.exists(path):
+                        total -= size
+
+            remaining = self._list_entries(policy)
+            stats.current_bytes = sum(size for _, size, _ in remaining)
+            stats.current_entries = len(remaining)
+            stats.last_run = now
+        return self.stats
+
+    def metrics(self) -> Dict[str, dict]:
+        return {
+            name: {
+                "current_bytes": stats.current_bytes,
+                "current_entries": stats.current_entries,
+                "bytes_reclaimed": stats.bytes_reclaimed,
+                "entries_evicted": stats.entries_evicted,
+                "last_run": stats.last_run,
+                "recent_errors": list(stats.errors),
+            }
+            for name, stats in self.stats.items()
+        }
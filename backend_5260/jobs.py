@@ -0,0 +1,228 @@
+"""
+Bounded job queue for paper summarization.
+
+Uploads are turned into jobs and handed to a fixed number of worker threads,
+each owning its own resident SummarizationWorker (models are loaded once per
+worker). When the queue is full, submit() raises QueueFullError with a retry
+hint instead of letting requests pile up.
+
+Each job records an append-only list of progress events (see Job.emit), which
+GET /jobs/{id}/events streams to the client as Server-Sent Events.
+"""
+
+import queue
+import threading
+import time
+import uuid
+import traceback
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue cannot accept more work"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full, retry after {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class Job:
+    """A single unit of work and its status"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+    def __init__(
+        self,
+        func: Callable,
+        args: tuple = (),
+        kwargs: Optional[dict] = None,
+        meta: Optional[dict] = None,
+        on_event: Optional[Callable[[str, dict], None]] = None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.meta = meta or {}
+        self.status = Job.QUEUED
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.events: List[Dict[str, Any]] = []
+        self._events_lock = threading.Lock()
+        self.on_event = on_event
+
+    @property
+    def done(self) -> bool:
+        return self.status in (Job.SUCCEEDED, Job.FAILED)
+
+    def emit(self, event: str, data: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Append a progress event. May be called from several threads at once
+        (batch jobs emit from the extract, retrieve and predict threads), so
+        the id is assigned and the event appended under a lock; ids stay equal
+        to list positions and readers can poll self.events without a lock.
+        """
+        with self._events_lock:
+            now = time.time()
+            self.events.append({
+                "id": len(self.events),
+                "event": event,
+                "time": now,
+                "elapsed": now - self.created_at,
+                "data": data or {},
+            })
+        if self.on_event is not None:
+            try:
+                self.on_event(event, data or {})
+            except Exception as e:
+                print(f"[WARN] Event listener failed on {event}: {e}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            **self.meta,
+        }
+
+
+class JobQueue:
+    """
+    Fixed pool of worker threads fed from a bounded FIFO queue.
+
+    Args:
+        worker_factory: Called once per worker thread to build the object
+            (e.g. a SummarizationWorker) passed as the first argument to jobs
+        num_workers: Number of worker threads (one resident model set each)
+        max_queue_size: Number of jobs allowed to wait for a worker
+        max_finished_jobs: Number of finished jobs kept for GET /jobs/{id}
+        on_event: Called with (event, data) for every progress event of
+            every job, e.g. to record metrics
+    """
+
+    def __init__(
+        self,
+        worker_factory: Callable[[], Any],
+        num_workers: int = 1,
+        max_queue_size: int = 8,
+        max_finished_jobs: int = 1000,
+        on_event: Optional[Callable[[str, dict], None]] = None,
+    ):
+        self.worker_factory = worker_factory
+        self.num_workers = max(1, num_workers)
+        self.max_finished_jobs = max_finished_jobs
+        self.on_event = on_event
+        self.workers: List[Any] = []
+        self._queue: "queue.Queue[Job]" = queue.Queue(maxsize=max(1, max_queue_size))
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._avg_duration: Optional[float] = None
+
+    def start(self) -> None:
+        """Build the workers (loading their models) and start the threads"""
+        for idx in range(self.num_workers):
+            worker = self.worker_factory()
+            self.workers.append(worker)
+            thread = threading.Thread(target=self._run, args=(worker,), name=f"job-worker-{idx}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func: Callable, *args, meta: Optional[dict] = None, **kwargs) -> Job:
+        """
+        Queue func(worker, *args, progress_callback=job.emit, **kwargs).
+        Raises QueueFullError when the queue is at capacity.
+        """
+        job = Job(func, args, kwargs, meta, self.on_event)
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFullError(self.retry_after())
+            self._jobs[job.id] = job
+            self._prune()
+        job.emit("queued", {"queue_position": self.position(job), "queue_depth": self.depth()})
+        return job
+
+    def complete(self, result: Any, meta: Optional[dict] = None) -> Job:
+        """
+        Register an already finished job (e.g. a cache hit) so it can be
+        queried and streamed like any other job.
+        """
+        job = Job(None, meta=meta)
+        job.started_at = job.finished_at = job.created_at
+        job.result = result
+        job.emit("done", {"result": result, "cached": True})
+        job.status = Job.SUCCEEDED
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def depth(self) -> int:
+        """Number of jobs waiting for a worker"""
+        return self._queue.qsize()
+
+    def position(self, job: Job) -> Optional[int]:
+        """1-based position of a queued job, None once it has started"""
+        with self._queue.mutex:
+            for idx, queued in enumerate(self._queue.queue):
+                if queued is job:
+                    return idx + 1
+        return None
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is likely to free up"""
+        if self._avg_duration is None:
+            return 30
+        return max(1, int(self._avg_duration * (self.depth() + 1) / self.num_workers))
+
+    def _run(self, worker: Any) -> None:
+        while True:
+            job = self._queue.get()
+            job.status = Job.RUNNING
+            job.started_at = time.time()
+            job.emit("running")
+            # the final event is emitted before the status flips, so a reader
+            # that sees job.done has already seen every event
+            try:
+                result = job.func(worker, *job.args, progress_callback=job.emit, **job.kwargs)
+                job.result = result
+                job.emit("done", {"result": result})
+                job.status = Job.SUCCEEDED
+            except Exception as e:
+                traceback.print_exc()
+                job.error = str(e)
+                job.emit("error", {"error": job.error})
+                job.status = Job.FAILED
+            finally:
+                job.finished_at = time.time()
+                self._record_duration(job.finished_at - job.started_at)
+                self._queue.task_done()
+
+    def _record_duration(self, seconds: float) -> None:
+        with self._lock:
+            if self._avg_duration is None:
+                self._avg_duration = seconds
+            else:
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * seconds
+
+    def _prune(self) -> None:
+        """Forget the oldest finished jobs beyond max_finished_jobs"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
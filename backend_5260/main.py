@@ -1,14 +1,18 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse
 
 import os
+import time
+import asyncio
+import uuid
 from datetime import datetime
-import shutil
-from typing import Optional
-import subprocess
+from io import BytesIO
+from typing import Optional, List
+from functools import partial
 import json
 import sys
 import ast
@@ -16,7 +20,6 @@ from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent   
 sys.path.insert(0, str(BASE_DIR))
-from datetime import datetime
 from ppt_generator.all_generators import (
     ppt_to_md,
     md_to_ppt,
@@ -25,6 +28,12 @@ from ppt_generator.all_generators import (
     json_to_md,
     md_to_json
 )
+from backend_5260.worker import SummarizationWorker, DATA_DIR
+from backend_5260.workspace import WORKSPACES_DIR
+from backend_5260.cache import ResultCache, DeckCache, hash_bytes
+from backend_5260.janitor import Janitor, ArtifactPolicy, is_content_key
+from backend_5260.jobs import JobQueue, QueueFullError
+from backend_5260 import metrics
 
 app = FastAPI()
 
@@ -41,20 +50,109 @@ UPLOAD_DIR = "uploads"
 if not os.path.exists(UPLOAD_DIR):
     os.makedirs(UPLOAD_DIR)
 
-import os
-import shutil
-import subprocess
-import json
-from pathlib import Path
+# 上传的 PDF/PPTX 与生成的 PPT 在内存中处理；是否在响应后异步写入 UPLOAD_DIR 可配置
+PERSIST_UPLOADS = os.environ.get("PERSIST_UPLOADS", "0") == "1"
+PERSIST_DECKS = os.environ.get("PERSIST_DECKS", "0") == "1"
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def persist_file(file_path: str, data: bytes):
+    """后台任务：将内存中的文件写入磁盘"""
+    with open(file_path, "wb") as f:
+        f.write(data)
+
+def iter_chunks(data: bytes, chunk_size: int = STREAM_CHUNK_SIZE):
+    """按固定大小分块流式返回内存中的文件"""
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield bytes(view[start:start + chunk_size])
+
+# 按 PDF 内容 (SHA-256) + 模型配置指纹缓存摘要结果
+CACHE_DIR = "cache"
+result_cache = ResultCache(CACHE_DIR, str(DATA_DIR))
+
+# 按 ppt_data 的规范化 JSON + 主题目录内容哈希缓存生成的 PPT
+PPT_THEME_PATH = "ppt_mode/1"  # 可以根据需要设置不同的主题模板
+deck_cache = DeckCache(CACHE_DIR)
+
+# 磁盘配额与保留策略：每类产物各自的 TTL 与容量上限 (LRU 淘汰)
+# 中间产物 (页面图片等) 与摘要缓存分开管理，淘汰中间产物不影响已缓存的摘要
+MB = 1024 * 1024
+HOUR = 3600
+janitor = Janitor(
+    [
+        ArtifactPolicy(
+            "uploads", UPLOAD_DIR,
+            max_bytes=int(os.environ.get("STORAGE_UPLOADS_MB", "1024")) * MB,
+            ttl_seconds=float(os.environ.get("STORAGE_UPLOADS_TTL_HOURS", "24")) * HOUR
+        ),
+        ArtifactPolicy(
+            "intermediates", str(DATA_DIR),
+            max_bytes=int(os.environ.get("STORAGE_INTERMEDIATES_MB", "5120")) * MB,
+            ttl_seconds=float(os.environ.get("STORAGE_INTERMEDIATES_TTL_HOURS", "168")) * HOUR,
+            entry_filter=is_content_key  # 只管理按内容寻址的目录，不动自带的示例论文
+        ),
+        ArtifactPolicy(
+            "summaries", os.path.join(CACHE_DIR, "summaries"),
+            max_bytes=int(os.environ.get("STORAGE_SUMMARIES_MB", "256")) * MB,
+            entry_filter=is_content_key
+        ),
+        ArtifactPolicy(
+            "decks", deck_cache.root,
+            max_bytes=int(os.environ.get("STORAGE_DECKS_MB", "256")) * MB,
+            entry_filter=lambda name: name.endswith(".pptx")
+        ),
+        # 任务中途失败或进程退出时残留的工作区
+        ArtifactPolicy(
+            "workspaces", os.path.join(str(DATA_DIR), WORKSPACES_DIR),
+            ttl_seconds=float(os.environ.get("STORAGE_WORKSPACES_TTL_HOURS", "6")) * HOUR
+        ),
+    ],
+    interval=float(os.environ.get("JANITOR_INTERVAL_SECONDS", "300"))
+)
+
+# 摘要任务队列：每个 worker 线程持有一套常驻模型，模型只在启动时加载一次
+SUMMARIZE_WORKERS = int(os.environ.get("SUMMARIZE_WORKERS", "1"))        # GPU worker 数量
+SUMMARIZE_QUEUE_SIZE = int(os.environ.get("SUMMARIZE_QUEUE_SIZE", "8"))  # 排队上限，超出返回 429
+# PDF 页面渲染进程数，默认随 CPU 核数扩展
+EXTRACT_WORKERS = int(os.environ.get("EXTRACT_WORKERS", str(min(8, os.cpu_count() or 1))))
+# 检索到的页面是否以 300 DPI 裁剪图交给 image agent (页面图片均在首次读取时按需渲染)
+RENDER_HIRES = os.environ.get("RENDER_HIRES", "1") == "1"
+# 页面图片编码: png / jpeg / webp，quality 只对 jpeg / webp 生效
+PAGE_IMAGE_CODEC = os.environ.get("PAGE_IMAGE_CODEC", "png")
+PAGE_IMAGE_QUALITY = int(os.environ["PAGE_IMAGE_QUALITY"]) if os.environ.get("PAGE_IMAGE_QUALITY") else None
+# 抽取内嵌图表，image agent 看检索页面上的图表裁剪图而不是整页
+EXTRACT_FIGURES = os.environ.get("EXTRACT_FIGURES", "0") == "1"
+job_queue = JobQueue(
+    partial(
+        SummarizationWorker,
+        extract_workers=EXTRACT_WORKERS,
+        hires=RENDER_HIRES,
+        image_codec=PAGE_IMAGE_CODEC,
+        image_quality=PAGE_IMAGE_QUALITY,
+        figures=EXTRACT_FIGURES
+    ),
+    num_workers=SUMMARIZE_WORKERS,
+    max_queue_size=SUMMARIZE_QUEUE_SIZE,
+    on_event=metrics.observe_event  # 由进度事件记录每页 / 每个 agent 的耗时
+)
+metrics.registry.register(metrics.Gauge(
+    "tldr_queue_waiting_jobs", "Jobs currently waiting for a worker", job_queue.depth
+))
+
+@app.on_event("startup")
+def start_job_queue():
+    job_queue.start()
 
-def process_paper(paper_pdf_path: str) -> dict:
+@app.on_event("startup")
+def start_janitor():
+    janitor.start()
+
+def process_paper(worker: SummarizationWorker, filename: str, pdf_key: str, pdf_bytes: bytes, progress_callback=None) -> dict:
     """
-    1. 将 PDF 复制到 SlidesSummarizer/data/<paper_name>/<paper_name>.pdf
-    2. 在 SlidesSummarizer/ 目录下依次运行：
-         python scripts/extract_paper.py --paper_name <paper_name>
-         python scripts/retrieve_content.py --paper_name <paper_name>
-         python scripts/predict.py paper_name=<paper_name>
-    3. 从 predict.py 的 stdout 解析 JSON, 返回: 
+    1. 由常驻 worker 依次执行 extract -> retrieve -> predict (模型已在启动时加载,
+       PDF 直接从内存打开, 结果写入按内容寻址的 data/<pdf_key>/, pdf_key 为 PDF 的 SHA-256;
+       已有的 extract / retrieve 结果直接复用)
+    2. 解析 summary JSON 并写入结果缓存, 返回: 
        {
             "content_summary": "This paper discusses deep learning techniques...",
             "contribution": "Main contributions include...",
@@ -64,61 +162,78 @@ def process_paper(paper_pdf_path: str) -> dict:
         }
     """
 
-    # 1. 定位各个目录
-    base_dir = Path(__file__).parent.resolve()                  # project/backend_5260
-    slides_dir = base_dir.parent / "SlidesSummarizer"           # project/SlidesSummarizer
-    scripts_dir = slides_dir / "scripts"                        # project/SlidesSummarizer/scripts
-    data_root   = slides_dir / "data"                           # project/SlidesSummarizer/data
+    # 1. 在常驻 worker 中依次执行 extract -> retrieve -> predict (处理期间禁止淘汰该目录)
+    with janitor.pinned(result_cache.stage_dir(pdf_key)):
+        summary = worker.process(pdf_key, progress_callback, pdf_bytes)
 
-    # 2. 准备目标子目录
-    base_name = Path(paper_pdf_path).stem                       
-    paper_name = "_".join(base_name.split("_")[2:])
-    dest_dir   = data_root / paper_name
-    dest_dir.mkdir(parents=True, exist_ok=True)
+    # 2. 解析并缓存 summary
+    summary_dict = cache_summary(worker, pdf_key, summary)
 
-    # 3. 复制 PDF 到 data/<paper_name>/
-    dest_pdf = dest_dir / f"{paper_name}.pdf"
-    shutil.copy(paper_pdf_path, dest_pdf)
+    return {
+        "paper_name": display_name(filename),
+        "summary": summary_dict
+    }
 
-    # 4. 依次运行三个脚本
-    #    注意： cwd 设置为 slides_dir，以便脚本能正确引用 data/ 目录
-    
-    subprocess.run(
-        ["python", str(scripts_dir / "extract_paper.py"), "--paper_name", paper_name],
-        cwd=str(slides_dir),
-        check=True
-    )
+def process_paper_batch(worker: SummarizationWorker, papers: List[dict], cached: List[dict], progress_callback=None) -> dict:
+    """
+    批量摘要: extract / retrieve / predict 三个阶段流水线执行,
+    每篇论文完成时推送 paper_done (或 paper_failed) 事件。
+    papers: [{"filename", "pdf_key", "pdf_bytes"}, ...]  待处理
+    cached: 已命中缓存的结果, 直接推送
+    """
+    results = list(cached)
+    for result in cached:
+        progress_callback("paper_done", result)
 
-    subprocess.run(
-        ["python", str(scripts_dir / "retrieve_content.py"), "--paper_name", paper_name],
-        cwd=str(slides_dir),
-        check=True
-    )
-    
-    subprocess.run(
-        ["python", str(scripts_dir / "predict.py"), f"paper_name={paper_name}"],
-        cwd=str(slides_dir),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-        check=True
-    )
-    
+    by_key = {}
+    pdf_bytes = {}
+    for paper in papers:
+        by_key.setdefault(paper["pdf_key"], []).append(paper)
+        pdf_bytes[paper["pdf_key"]] = paper["pdf_bytes"]
 
-    # 5. 解析 predict.py 的输出（最终 dict 以 JSON 打印到 stdout）
+    def on_result(pdf_key, summary, error):
+        # 同一批中内容相同的 PDF 只处理一次
+        for paper in by_key[pdf_key]:
+            result = {
+                "paper_name": display_name(paper["filename"]),
+                "filename": paper["filename"],
+                "pdf_key": pdf_key,
+            }
+            try:
+                if error is not None:
+                    raise error
+                result["summary"] = cache_summary(worker, pdf_key, summary)
+                result["status"] = "succeeded"
+                progress_callback("paper_done", result)
+            except Exception as e:
+                result["status"] = "failed"
+                result["error"] = str(e)
+                progress_callback("paper_failed", result)
+            results.append(result)
+
+    with janitor.pinned(*[result_cache.stage_dir(pdf_key) for pdf_key in by_key]):
+        worker.process_batch(list(by_key), on_result, progress_callback, pdf_bytes)
+    return {"papers": results}
+
+def unique_filename(name: str, timestamp: Optional[str] = None) -> str:
+    """生成 <日期>_<时间>_<随机串>_<原文件名>，同一秒内的并发上传也不会重名"""
+    timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{timestamp}_{uuid.uuid4().hex[:8]}_{name}"
+
+def display_name(file_path: str) -> str:
+    """从 unique_filename 生成的文件名中取回原文件名"""
+    return "_".join(Path(file_path).stem.split("_")[3:])
+
+def cache_summary(worker: SummarizationWorker, pdf_key: str, summary: str) -> dict:
+    """解析 sum_agent 返回的 JSON 字符串并写入结果缓存"""
     try:
-        with open(dest_dir / "summary.json", 'r') as f:
-            # First parse the outer string, then parse the inner JSON string
-            summary_dict = json.loads(json.loads(f.read()))
+        summary_dict = json.loads(summary)
     except json.JSONDecodeError as e:
         raise RuntimeError(
-            f"Failed to parse JSON from predict.py\n"
+            f"Failed to parse JSON from summary agent\n"
         )
-
-    return {
-        "paper_name": paper_name,
-        "summary": summary_dict
-    }
+    result_cache.put_summary(pdf_key, worker.fingerprint, summary_dict)
+    return summary_dict
 
 def mock_pdf_processing():
     """
@@ -172,41 +287,64 @@ def mock_ppt_processing():
     }
 
 @app.post("/pdf/summarize")
-async def summarize_pdf(pdf: UploadFile = File(...)):
+async def summarize_pdf(background_tasks: BackgroundTasks, pdf: UploadFile = File(...)):
     try:
         # 验证文件类型
         if not pdf.filename.endswith('.pdf'):
             raise HTTPException(status_code=400, detail="Only PDF files are allowed")
         
         # 生成唯一的文件名
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{pdf.filename}"
-        file_path = os.path.join(UPLOAD_DIR, filename)
+        filename = unique_filename(pdf.filename)
+        file_path = None
         
-        # 保存文件
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(pdf.file, buffer)
-        
-        # 获取模拟的处理结果
-        #processing_result = mock_pdf_processing()
-        processing_result = process_paper(file_path)
+        # 读入内存，PyMuPDF 直接从内存打开；按需在响应后异步落盘
+        pdf_bytes = await pdf.read()
+        pdf_key = hash_bytes(pdf_bytes)
+        if PERSIST_UPLOADS:
+            file_path = os.path.join(UPLOAD_DIR, filename)
+            background_tasks.add_task(persist_file, file_path, pdf_bytes)
+        meta = {"filename": filename, "file_path": file_path, "pdf_key": pdf_key}
+
+        # 相同 PDF + 相同模型配置：直接返回缓存的摘要
+        cached_summary = result_cache.get_summary(pdf_key, job_queue.workers[0].fingerprint)
+        if cached_summary is not None:
+            paper_name = display_name(filename)
+            job = job_queue.complete({"paper_name": paper_name, "summary": cached_summary}, meta=meta)
+            return JSONResponse(
+                status_code=200,
+                content={
+                    "status": job.status,
+                    "message": "PDF file processed successfully (cached)",
+                    "job_id": job.id,
+                    "status_url": f"/jobs/{job.id}",
+                    "events_url": f"/jobs/{job.id}/events",
+                    "filename": filename,
+                    "file_path": file_path,
+                    "paper_name": paper_name,
+                    "summary": cached_summary
+                }
+            )
         
-        """
+        # 提交到任务队列，立即返回 job id；结果通过 GET /jobs/{job_id} 查询
         try:
-            processing_result = await run_in_threadpool(process_paper, file_path)
-        except Exception as e:
-            # process_paper 内部抛出的任何异常，都转成 500 返回
-            raise HTTPException(status_code=500, detail=str(e))
-        """
+            job = job_queue.submit(process_paper, filename, pdf_key, pdf_bytes, meta=meta)
+        except QueueFullError as e:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Too many papers in progress, please retry in {e.retry_after} seconds",
+                headers={"Retry-After": str(e.retry_after)}
+            )
+
         return JSONResponse(
-            status_code=200,
+            status_code=202,
             content={
-                "status": "success",
-                "message": "PDF file processed successfully",
+                "status": job.status,
+                "message": "PDF file queued for processing",
+                "job_id": job.id,
+                "status_url": f"/jobs/{job.id}",
+                "events_url": f"/jobs/{job.id}/events",
                 "filename": filename,
-                "file_path": file_path,
-                "paper_name": processing_result["paper_name"],
-                "summary": processing_result["summary"]
+                "file_path": file_path
             }
         )
     except HTTPException as he:
@@ -214,8 +352,194 @@ async def summarize_pdf(pdf: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    查询摘要任务状态: queued / running / succeeded / failed
+    succeeded 时附带 paper_name 与 summary
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    content = job.to_dict()
+    if job.status == job.QUEUED:
+        content["queue_position"] = job_queue.position(job)
+    elif job.status == job.SUCCEEDED:
+        content["message"] = "PDF file processed successfully"
+        content.update(job.result)
+    return JSONResponse(status_code=200, content=content)
+
+@app.post("/pdf/summarize-batch")
+async def summarize_pdf_batch(background_tasks: BackgroundTasks, pdfs: List[UploadFile] = File(...)):
+    """
+    批量上传多个 PDF, 作为一个任务流水线处理:
+    第 k+1 篇在 CPU 线程上渲染, 同时 ColPali 嵌入第 k 篇, agents 摘要第 k-1 篇。
+    每篇完成后通过 GET /jobs/{job_id}/events 推送 paper_done 事件,
+    全部完成后 GET /jobs/{job_id} 返回 {"papers": [...]}
+    """
+    try:
+        for pdf in pdfs:
+            if not pdf.filename.endswith('.pdf'):
+                raise HTTPException(status_code=400, detail=f"Only PDF files are allowed: {pdf.filename}")
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        fingerprint = job_queue.workers[0].fingerprint
+        papers, cached, filenames = [], [], []
+        for pdf in pdfs:
+            filename = unique_filename(pdf.filename, timestamp)
+            filenames.append(filename)
+            pdf_bytes = await pdf.read()
+            pdf_key = hash_bytes(pdf_bytes)
+            if PERSIST_UPLOADS:
+                background_tasks.add_task(persist_file, os.path.join(UPLOAD_DIR, filename), pdf_bytes)
+
+            cached_summary = result_cache.get_summary(pdf_key, fingerprint)
+            if cached_summary is not None:
+                cached.append({
+                    "paper_name": display_name(filename),
+                    "filename": filename,
+                    "pdf_key": pdf_key,
+                    "status": "succeeded",
+                    "summary": cached_summary
+                })
+            else:
+                papers.append({"filename": filename, "pdf_key": pdf_key, "pdf_bytes": pdf_bytes})
+
+        meta = {"filenames": filenames}
+        if not papers:
+            job = job_queue.complete({"papers": cached}, meta=meta)
+        else:
+            try:
+                job = job_queue.submit(process_paper_batch, papers, cached, meta=meta)
+            except QueueFullError as e:
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"Too many papers in progress, please retry in {e.retry_after} seconds",
+                    headers={"Retry-After": str(e.retry_after)}
+                )
+
+        return JSONResponse(
+            status_code=200 if job.done else 202,
+            content={
+                "status": job.status,
+                "message": f"{len(pdfs)} PDF files queued for processing ({len(cached)} cached)",
+                "job_id": job.id,
+                "status_url": f"/jobs/{job.id}",
+                "events_url": f"/jobs/{job.id}/events",
+                "num_papers": len(pdfs),
+                "num_cached": len(cached)
+            }
+        )
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def search_library(worker: SummarizationWorker, query: str, top_k: int, progress_callback=None) -> dict:
+    """在所有已处理论文的页面中检索, paper_name 为论文目录名 (pdf_key)"""
+    return {"query": query, "results": worker.search_library(query, top_k, progress_callback)}
+
+@app.post("/library/search")
+async def library_search(search: dict):
+    """
+    跨论文的页面检索: {"query": "transformer architecture diagram", "top_k": 5}
+    与摘要任务共用 worker (ColPali 模型常驻其中), 结果通过 GET /jobs/{job_id} 查询:
+    {"query": ..., "results": [{paper_name, page_name, page_num, image_path, score}, ...]}
+    """
+    query = str(search.get("query", "")).strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="query is required")
+    try:
+        top_k = max(1, min(100, int(search.get("top_k", 5))))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="top_k must be an integer")
+
+    try:
+        job = job_queue.submit(search_library, query, top_k, meta={"query": query})
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many jobs in progress, please retry in {e.retry_after} seconds",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    return JSONResponse(
+        status_code=202,
+        content={
+            "status": job.status,
+            "message": "Library search queued",
+            "job_id": job.id,
+            "status_url": f"/jobs/{job.id}",
+            "events_url": f"/jobs/{job.id}/events"
+        }
+    )
+
+@app.get("/storage")
+async def storage_stats():
+    """
+    各类产物 (uploads / intermediates / summaries) 的占用与回收统计:
+    current_bytes, current_entries, bytes_reclaimed, entries_evicted
+    """
+    return JSONResponse(status_code=200, content=janitor.metrics())
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Prometheus 文本格式的指标: 每页渲染 / ColPali 嵌入耗时、各阶段耗时、
+    各 agent predict 耗时与 token 数、PPT 生成耗时与页数、队列深度
+    """
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+def format_sse(event: dict) -> str:
+    """将 job 事件编码为一条 Server-Sent Event"""
+    payload = {"elapsed": event["elapsed"], **event["data"]}
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """
+    以 SSE 推送摘要任务的进度事件:
+      queued / running
+      stage_started, stage_finished  (extract / retrieve / predict)
+      extract_page                   (每页渲染完成)
+      embed_page                     (每页 ColPali 嵌入完成)
+      agent_done                     (general / critical / text / image / sum agent)
+      paper_done, paper_failed       (批量任务中每篇论文完成)
+      done (附带最终 summary) / error
+    支持 Last-Event-ID 断线续传
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    last_event_id = request.headers.get("last-event-id", "")
+    cursor = int(last_event_id) + 1 if last_event_id.isdigit() else 0
+
+    async def event_stream():
+        nonlocal cursor
+        last_sent = time.time()
+        while True:
+            # 先读取状态再读取事件：done/error 事件总是在状态改变前写入
+            finished = job.done
+            while cursor < len(job.events):
+                yield format_sse(job.events[cursor])
+                cursor += 1
+                last_sent = time.time()
+            if finished or await request.is_disconnected():
+                break
+            if time.time() - last_sent > 15:
+                yield ": keep-alive\n\n"
+                last_sent = time.time()
+            await asyncio.sleep(0.25)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/generate-ppt")
-async def generate_ppt(ppt_data: dict):
+async def generate_ppt(ppt_data: dict, background_tasks: BackgroundTasks):
     """
     生成 PPT 的逻辑：
     1. 基于 ppt_data 数据生成 PPT
@@ -243,53 +567,71 @@ async def generate_ppt(ppt_data: dict):
     }
     """
     
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # 相同内容 + 相同主题：直接返回缓存的 PPT，不再重新生成
+    deck_key = await run_in_threadpool(deck_cache.deck_key, ppt_data, PPT_THEME_PATH)
+    ppt_bytes = await run_in_threadpool(deck_cache.get, deck_key)
+    metrics.deck_cache_total.inc(1, "miss" if ppt_bytes is None else "hit")
 
-    # 调用 json_to_ppt 来生成 PPT 文件
-    ppt_output_path = os.path.join(UPLOAD_DIR, f"{timestamp}_generated.pptx")
-    try:
-        json_to_ppt(
-            json_obj=ppt_data,
-            theme_path="ppt_mode/1",  # 可以根据需要设置不同的主题模板
-            save_path=ppt_output_path,
-            img_dic={}, 
-            inter_md_path=None  
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"PPT generation failed: {e}")
+    if ppt_bytes is None:
+        # 调用 json_to_ppt 在内存中生成 PPT 文件 (放到线程池，避免阻塞事件循环)
+        # 背景图按 deck_key 固定随机种子，重新生成的结果与缓存一致
+        buffer = BytesIO()
+        build_start = time.time()
+        try:
+            num_slides = await run_in_threadpool(
+                json_to_ppt,
+                json_obj=ppt_data,
+                theme_path=PPT_THEME_PATH,
+                save_path=buffer,
+                img_dic={}, 
+                inter_md_path=None,
+                seed=deck_cache.seed(deck_key)
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"PPT generation failed: {e}")
+        metrics.ppt_build_seconds.observe(time.time() - build_start)
+        metrics.ppt_slides.observe(num_slides)
+        ppt_bytes = buffer.getvalue()
+        background_tasks.add_task(deck_cache.put, deck_key, ppt_bytes)
 
-    # 以流的形式返回 PPT 文件
-    def iter_ppt():
-        with open(ppt_output_path, "rb") as f:
-            yield from f
-    
+    if PERSIST_DECKS:
+        ppt_output_path = os.path.join(UPLOAD_DIR, unique_filename("generated.pptx"))
+        background_tasks.add_task(persist_file, ppt_output_path, ppt_bytes)
+
+    # 以固定大小分块的流返回 PPT 文件
     filename = f"{ppt_data['title']}.pptx"
     return StreamingResponse(
-        iter_ppt(),
+        iter_chunks(ppt_bytes),
         media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Content-Length": str(len(ppt_bytes))
+        },
+        background=background_tasks
     )
 
 @app.post("/ppt/process")
-async def process_ppt(ppt: UploadFile = File(...)):
+async def process_ppt(background_tasks: BackgroundTasks, ppt: UploadFile = File(...)):
     try:
         # 验证文件类型
         if not ppt.filename.endswith('.pptx'):
             raise HTTPException(status_code=400, detail="Only PPTX files are allowed")
         
         # 生成唯一的文件名
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{ppt.filename}"
-        file_path = os.path.join(UPLOAD_DIR, filename)
+        filename = unique_filename(ppt.filename)
+        file_path = None
         
-        # 保存文件
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(ppt.file, buffer)
+        # 读入内存直接解析；按需在响应后异步落盘
+        ppt_bytes = await ppt.read()
+        if PERSIST_UPLOADS:
+            file_path = os.path.join(UPLOAD_DIR, filename)
+            background_tasks.add_task(persist_file, file_path, ppt_bytes)
         
         # 获取模拟的处理结果
         #processing_result = mock_ppt_processing()
-        data = ppt_to_json(
-            ppt_path=file_path,
+        data = await run_in_threadpool(
+            ppt_to_json,
+            ppt_path=BytesIO(ppt_bytes),
             theme_path="ppt_mode/1",
             output_img_dir=None,           # 禁止图片提取
             inter_md_path=None             # 不保存中间md
@@ -0,0 +1,204 @@
+"""
+Minimal Prometheus-style metrics for the backend.
+
+Histograms, counters and gauges are kept in process and rendered in the
+Prometheus text exposition format by GET /metrics. Per-page and per-agent
+timings are not measured here: the pipeline already reports them as progress
+events (extract_page, embed_page, agent_done, stage_finished), and
+observe_event() turns those events into observations.
+"""
+
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# seconds, from a fast page render up to a slow multi-agent summary
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = [
+        (k, str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for k, v in pairs
+    ]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """
+    Args:
+        name: Metric name
+        documentation: HELP text
+        labels: Label names; observations pass values in the same order
+    """
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, label_values: Sequence[str]) -> LabelValues:
+        if len(label_values) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(label_values)}")
+        return tuple(str(v) for v in label_values)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, *label_values: str) -> None:
+        key = self._key(label_values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Metric):
+    """A gauge whose value is read from a callback at scrape time"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.read = read
+
+    def samples(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception:
+            return []
+        return [f"{self.name} {_format_value(value)}"]
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label values -> (per-bucket counts, sum, count)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        key = self._key(label_values)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[idx] += 1
+                    break
+            self._values[key] = (counts, total + value, count + 1)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s, n)) for k, (c, s, n) in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+registry = Registry()
+
+page_render_seconds = registry.register(Histogram(
+    "tldr_pdf_page_render_seconds", "Time to render and extract text from one PDF page"
+))
+page_embed_seconds = registry.register(Histogram(
+    "tldr_colpali_page_embed_seconds", "Time to embed one page image with ColPali"
+))
+stage_seconds = registry.register(Histogram(
+    "tldr_stage_seconds", "Time spent in a pipeline stage for one paper (cached stages excluded)", ["stage"]
+))
+stage_cached_total = registry.register(Counter(
+    "tldr_stage_cached_total", "Pipeline stages skipped because their results were reused", ["stage"]
+))
+agent_predict_seconds = registry.register(Histogram(
+    "tldr_agent_predict_seconds", "Latency of one agent predict call", ["agent"]
+))
+agent_tokens = registry.register(Histogram(
+    "tldr_agent_tokens", "Tokens used by one agent predict call, where the model backend reports them",
+    ["agent", "kind"], buckets=TOKEN_BUCKETS
+))
+ppt_build_seconds = registry.register(Histogram(
+    "tldr_ppt_build_seconds", "Time to build a deck with PptGenerator"
+))
+ppt_slides = registry.register(Histogram(
+    "tldr_ppt_slides", "Number of slides in a generated deck", buckets=COUNT_BUCKETS
+))
+deck_cache_total = registry.register(Counter(
+    "tldr_deck_cache_total", "Deck requests served from the deck cache (hit) or built (miss)", ["result"]
+))
+queue_depth = registry.register(Histogram(
+    "tldr_queue_depth", "Jobs waiting for a worker, sampled when a job is submitted", buckets=COUNT_BUCKETS
+))
+
+
+def observe_event(event: str, data: dict) -> None:
+    """Record a pipeline progress event (used as the JobQueue event listener)"""
+    if event == "extract_page":
+        page_render_seconds.observe(data["seconds"])
+    elif event == "embed_page":
+        page_embed_seconds.observe(data["seconds"])
+    elif event == "stage_finished":
+        if data.get("cached"):
+            stage_cached_total.inc(1, data["stage"])
+        else:
+            stage_seconds.observe(data["seconds"], data["stage"])
+    elif event == "agent_done":
+        agent_predict_seconds.observe(data["seconds"], data["agent"])
+        for kind, tokens in (data.get("usage") or {}).items():
+            if tokens is not None:
+                agent_tokens.observe(tokens, data["agent"], kind)
+    elif event == "queued":
+        queue_depth.observe(data.get("queue_depth", 0))
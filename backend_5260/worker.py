@@ -0,0 +1,457 @@
+"""
+Resident summarization worker.
+
+Loads the ColPali retriever (ImageRetrieval) and the agent models
+(SlidesSummaryAgent) once when the backend starts, and runs
+extract -> retrieve -> predict for each paper as plain function calls
+instead of three cold-started subprocesses.
+"""
+
+import os
+import sys
+import time
+import queue
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ProgressCallback = Callable[[str, Dict[str, Any]], None]
+# result_callback(paper_name, summary, error) for batch processing
+ResultCallback = Callable[[str, Optional[str], Optional[Exception]], None]
+
+# pages rendered ahead of the ColPali embedder when extraction is streamed
+STREAM_LOOKAHEAD_PAGES = 4
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SLIDES_DIR = BASE_DIR / "SlidesSummarizer"          # project/SlidesSummarizer
+CONFIG_DIR = SLIDES_DIR / "config"                  # project/SlidesSummarizer/config
+DATA_DIR = SLIDES_DIR / "data"                      # project/SlidesSummarizer/data
+sys.path.insert(0, str(SLIDES_DIR))
+
+from hydra import initialize_config_dir, compose
+from omegaconf import DictConfig
+
+from mydatasets.base_dataset import BaseDataset
+from agents.slides_summary_agent import SlidesSummaryAgent
+from retrieval.embedding_store import EMBEDDINGS_DIR
+from retrieval.image_retrieval import ImageRetrieval
+from retrieval.library_retrieval import LibraryRetrieval
+from scripts.extract_paper import extract_paper, stream_paper
+from scripts.figures import extract_pdf_figures
+from scripts.render_profiles import image_dir_for
+from scripts.predict import resolve_agent_configs
+from backend_5260.cache import config_fingerprint
+from backend_5260.workspace import Workspace
+
+
+def load_config(overrides: Optional[List[str]] = None) -> DictConfig:
+    """
+    Compose SlidesSummarizer/config/base.yaml the same way predict.py does,
+    with the agent and model configs resolved.
+    """
+    with initialize_config_dir(config_dir=str(CONFIG_DIR), version_base="1.2"):
+        cfg = compose(config_name="base", overrides=overrides or [])
+        resolve_agent_configs(cfg)
+    return cfg
+
+
+class SummarizationWorker:
+    """
+    Holds the retrieval and agent models for the lifetime of the backend.
+
+    Args:
+        data_folder: Folder holding per-paper stage artifacts
+        overrides: Hydra overrides for SlidesSummarizer/config/base.yaml
+        top_k: Number of pages retrieved per special query
+        extract_workers: Number of processes rendering PDF pages
+        hires: Give the image agent 300 DPI crops of the retrieved pages
+            instead of VLM-sized pages
+        image_codec: Page image codec (png, jpeg, webp)
+        image_quality: Encoder quality (1-100) for jpeg and webp
+        figures: Extract embedded figures and give the image agent figure
+            crops of the retrieved pages instead of whole pages
+    """
+
+    def __init__(
+        self,
+        data_folder: str = str(DATA_DIR),
+        overrides: Optional[List[str]] = None,
+        top_k: int = 3,
+        extract_workers: int = 1,
+        hires: bool = True,
+        image_codec: str = "png",
+        image_quality: Optional[int] = None,
+        figures: bool = False,
+    ):
+        self.data_folder = str(data_folder)
+        self.top_k = top_k
+        self.extract_workers = extract_workers
+        self.hires = hires
+        self.image_codec = image_codec
+        self.image_quality = image_quality
+        self.figures = figures
+        self.cfg = load_config(overrides)
+        # page images the agents see change the summary, so they are part of the cache key
+        self.fingerprint = config_fingerprint(self.cfg, {
+            "hires": hires,
+            "image_codec": image_codec,
+            "image_quality": image_quality,
+            "figures": figures,
+        })
+
+        os.environ["CUDA_VISIBLE_DEVICES"] = self.cfg.cuda_visible_devices
+        os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "max_split_size_mb:64"
+
+        print("[INFO] Loading summarization models...")
+        self.retriever = ImageRetrieval()
+        self.summary_agent = SlidesSummaryAgent(self.cfg)
+        # cross-paper page index, built on the first library search
+        self.library: Optional[LibraryRetrieval] = None
+        # agents keep their message history between calls, so one paper at a time
+        self._lock = threading.Lock()
+        print("[INFO] Summarization worker ready.")
+
+    def extract(
+        self,
+        paper_name: str,
+        progress_callback: Optional[ProgressCallback] = None,
+        pdf_bytes: Optional[bytes] = None,
+        data_folder: Optional[str] = None,
+    ) -> dict:
+        """
+        Render pages and extract text into <data_folder>/<paper_name>/. With
+        pdf_bytes the PDF is opened from memory instead of
+        <data_folder>/<paper_name>/<paper_name>.pdf
+        """
+        data_folder = data_folder or self.data_folder
+        result = extract_paper(
+            paper_name=paper_name,
+            data_folder=data_folder,
+            output_dir=data_folder,
+            progress_callback=progress_callback,
+            pdf_bytes=pdf_bytes,
+            workers=self.extract_workers,
+            codec=self.image_codec,
+            quality=self.image_quality,
+            figures=self.figures,
+        )
+        if result.get("error"):
+            raise RuntimeError(f"Extraction failed: {result['error']}")
+        return result
+
+    def retrieve(
+        self,
+        paper_name: str,
+        progress_callback: Optional[ProgressCallback] = None,
+        data_folder: Optional[str] = None,
+    ) -> dict:
+        """Find model structure and experiment result pages with ColPali"""
+        paper_dir = os.path.join(data_folder or self.data_folder, paper_name)
+        image_dir = image_dir_for(paper_dir, self.retriever.render_profile)
+        output_dir = os.path.join(paper_dir, "retrieval")
+        return self.retriever.find_specialized_pages(image_dir, output_dir, self.top_k, progress_callback)
+
+    def predict(self, paper_name: str, progress_callback: Optional[ProgressCallback] = None) -> str:
+        """Run the multi-agent summary on a committed paper and return the raw summary string"""
+        self.summary_agent.clean_messages()
+        dataset = BaseDataset(
+            paper_name,
+            data_folder=self.data_folder,
+            retrieval_image_profile="hires" if self.hires else "vlm",
+            image_codec=self.image_codec,
+            image_quality=self.image_quality,
+            use_figures=self.figures,
+        )
+        if self.figures:
+            self.ensure_figures(dataset, progress_callback)
+        summary, all_messages = self.summary_agent.predict(dataset, progress_callback)
+        return summary
+
+    def ensure_figures(self, dataset: BaseDataset, progress_callback: Optional[ProgressCallback] = None) -> None:
+        """
+        Extract figures for a paper prepared while figure extraction was off.
+        Stage reuse only checks for retrieval results, so without this a paper
+        first extracted with figures=False would never get figures.json.
+        """
+        if os.path.exists(dataset.figures_file):
+            return
+        if not os.path.exists(dataset.pdf_path):
+            print(f"[WARN] No PDF to extract figures from: {dataset.pdf_path}")
+            return
+        with stage("figures", progress_callback):
+            extract_pdf_figures(
+                dataset.pdf_path, dataset.paper_folder, dataset.get_structure(), self.image_codec, self.image_quality
+            )
+
+    # Extraction and retrieval only depend on the PDF, not on the model
+    # config. They run in a per-job Workspace and are committed together
+    # into data/<paper_name>/, which is then reused by later jobs.
+
+    @staticmethod
+    def is_prepared(paper_dir: str) -> bool:
+        """Whether a paper directory holds completed extraction and retrieval"""
+        return os.path.exists(os.path.join(paper_dir, "retrieval", "specialized_pages.json"))
+
+    def open_workspace(self, paper_name: str, pdf_bytes: Optional[bytes] = None) -> Tuple[Workspace, Optional[bytes]]:
+        """
+        Create an isolated workspace for a paper. A PDF already placed at
+        data/<paper_name>/<paper_name>.pdf is read when pdf_bytes is not given.
+        """
+        if pdf_bytes is None:
+            pdf_path = os.path.join(self.data_folder, paper_name, f"{paper_name}.pdf")
+            if os.path.exists(pdf_path):
+                with open(pdf_path, "rb") as f:
+                    pdf_bytes = f.read()
+        return Workspace(self.data_folder, paper_name).open(), pdf_bytes
+
+    def run_extract(
+        self,
+        workspace: Workspace,
+        progress_callback: Optional[ProgressCallback] = None,
+        pdf_bytes: Optional[bytes] = None,
+    ) -> None:
+        with stage("extract", progress_callback):
+            self.extract(workspace.paper_name, progress_callback, pdf_bytes, workspace.root)
+
+    def run_retrieve(self, workspace: Workspace, progress_callback: Optional[ProgressCallback] = None) -> None:
+        """Retrieve inside the workspace, then commit it into data/<paper_name>/"""
+        self.seed_embeddings(workspace)
+        with stage("retrieve", progress_callback):
+            self.retrieve(workspace.paper_name, progress_callback, workspace.root)
+        workspace.commit(self.is_prepared)
+
+    def seed_embeddings(self, workspace: Workspace) -> None:
+        """
+        Copy the page embeddings of an earlier run of the paper into the
+        workspace, so only pages that changed are embedded again
+        """
+        source = os.path.join(workspace.target_dir, EMBEDDINGS_DIR)
+        target = os.path.join(workspace.paper_dir, EMBEDDINGS_DIR)
+        if os.path.isdir(source) and not os.path.exists(target):
+            try:
+                shutil.copytree(source, target)
+            except OSError as e:
+                print(f"[WARN] Could not reuse stored embeddings of {workspace.paper_name}: {e}")
+
+    def run_extract_retrieve(
+        self,
+        workspace: Workspace,
+        progress_callback: Optional[ProgressCallback] = None,
+        pdf_bytes: Optional[bytes] = None,
+    ) -> None:
+        """
+        Extract and retrieve with pages streamed from the renderer to ColPali:
+        an extraction thread renders pages into a bounded queue while the
+        calling thread embeds them, so the first embeddings are computed while
+        later pages are still rendering. Commits the workspace like run_retrieve.
+        """
+        self.seed_embeddings(workspace)
+        records: "queue.Queue" = queue.Queue(maxsize=STREAM_LOOKAHEAD_PAGES)
+        stop = threading.Event()
+
+        def produce():
+            try:
+                with stage("extract", progress_callback):
+                    for record in stream_paper(
+                        paper_name=workspace.paper_name,
+                        data_folder=workspace.root,
+                        output_dir=workspace.root,
+                        progress_callback=progress_callback,
+                        pdf_bytes=pdf_bytes,
+                        workers=self.extract_workers,
+                        codec=self.image_codec,
+                        quality=self.image_quality,
+                        image_profile=self.retriever.render_profile,
+                        figures=self.figures,
+                    ):
+                        records.put(record)
+                        if stop.is_set():
+                            break
+            except Exception as e:
+                records.put(e)
+            records.put(None)
+
+        def consume():
+            while (item := records.get()) is not None:
+                if isinstance(item, Exception):
+                    raise RuntimeError(f"Extraction failed: {item}") from item
+                yield item
+
+        producer = threading.Thread(target=produce, name="stream-extract", daemon=True)
+        producer.start()
+        try:
+            with stage("retrieve", progress_callback):
+                paper_dir = workspace.paper_dir
+                image_embeddings, image_paths = self.retriever.embed_stream(
+                    consume(), progress_callback, self.retriever.embedding_store(paper_dir)
+                )
+                self.retriever.find_specialized_pages(
+                    image_dir_for(paper_dir, self.retriever.render_profile),
+                    os.path.join(paper_dir, "retrieval"),
+                    self.top_k,
+                    progress_callback,
+                    image_embeddings,
+                    image_paths,
+                )
+        finally:
+            # unblock the producer if embedding failed part way
+            stop.set()
+            while producer.is_alive():
+                try:
+                    records.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        workspace.commit(self.is_prepared)
+
+    def run_predict(self, paper_name: str, progress_callback: Optional[ProgressCallback] = None) -> str:
+        with stage("predict", progress_callback):
+            return self.predict(paper_name, progress_callback)
+
+    def prepare(
+        self,
+        paper_name: str,
+        progress_callback: Optional[ProgressCallback] = None,
+        pdf_bytes: Optional[bytes] = None,
+    ) -> None:
+        """Make sure data/<paper_name>/ holds committed extraction and retrieval results"""
+        if self.is_prepared(os.path.join(self.data_folder, paper_name)):
+            skip_stages(("extract", "retrieve"), progress_callback)
+            return
+        workspace, pdf_bytes = self.open_workspace(paper_name, pdf_bytes)
+        with workspace:
+            self.run_extract_retrieve(workspace, progress_callback, pdf_bytes)
+
+    def process(
+        self,
+        paper_name: str,
+        progress_callback: Optional[ProgressCallback] = None,
+        pdf_bytes: Optional[bytes] = None,
+    ) -> str:
+        """
+        Run extract -> retrieve -> predict and return the raw summary string.
+        The PDF is read from pdf_bytes when given, otherwise from
+        data/<paper_name>/<paper_name>.pdf.
+        """
+        with self._lock:
+            self.prepare(paper_name, progress_callback, pdf_bytes)
+            return self.run_predict(paper_name, progress_callback)
+
+    def search_library(
+        self,
+        query: str,
+        top_k: int = 5,
+        progress_callback: Optional[ProgressCallback] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Search the pages of every paper in the data folder. The library index
+        is synced first, so papers added since the last search are embedded
+        (reusing their stored embeddings) before the query runs.
+        """
+        with self._lock:
+            if self.library is None:
+                self.library = LibraryRetrieval(self.retriever, self.data_folder)
+            with stage("index", progress_callback):
+                self.library.prepare_documents(progress_callback=progress_callback)
+            with stage("search", progress_callback):
+                return self.library.retrieve(query, top_k=top_k)
+
+    def process_batch(
+        self,
+        paper_names: List[str],
+        result_callback: ResultCallback,
+        progress_callback: Optional[ProgressCallback] = None,
+        pdf_bytes: Optional[Dict[str, bytes]] = None,
+        lookahead: int = 1,
+    ) -> None:
+        """
+        Summarize several papers with the three stages pipelined: while the
+        agents summarize paper k-1 on the calling thread, ColPali embeds paper k
+        on a retrieval thread and PyMuPDF renders paper k+1 on an extraction
+        thread. Stages are connected by queues holding at most `lookahead`
+        papers, so a slow stage throttles the ones before it.
+
+        result_callback(paper_name, summary, error) is called in input order
+        as each paper finishes; a failure in one paper does not stop the rest.
+        Progress events carry a "paper" field naming the paper they belong to.
+        pdf_bytes optionally maps paper names to in-memory PDF content.
+        """
+        pdf_bytes = pdf_bytes or {}
+        extracted: "queue.Queue" = queue.Queue(maxsize=lookahead)
+        retrieved: "queue.Queue" = queue.Queue(maxsize=lookahead)
+
+        def paper_progress(paper_name: str) -> Optional[ProgressCallback]:
+            if progress_callback is None:
+                return None
+            return lambda event, data: progress_callback(event, {"paper": paper_name, **data})
+
+        def extract_loop():
+            # This thread extracts the papers one after another while the predict thread
+            # below renders pages lazily through page_image_cache at the same time. PyMuPDF
+            # is not thread-safe; this is only safe because every fitz call on both
+            # threads holds FITZ_LOCK
+            for paper_name in paper_names:
+                workspace, error = None, None
+                callback = paper_progress(paper_name)
+                try:
+                    if self.is_prepared(os.path.join(self.data_folder, paper_name)):
+                        skip_stages(("extract", "retrieve"), callback)
+                    else:
+                        workspace, data = self.open_workspace(paper_name, pdf_bytes.get(paper_name))
+                        self.run_extract(workspace, callback, data)
+                except Exception as e:
+                    error = e
+                extracted.put((paper_name, workspace, error))
+            extracted.put(None)
+
+        def retrieve_loop():
+            while (item := extracted.get()) is not None:
+                paper_name, workspace, error = item
+                try:
+                    if workspace is not None and error is None:
+                        self.run_retrieve(workspace, paper_progress(paper_name))
+                except Exception as e:
+                    error = e
+                finally:
+                    if workspace is not None:
+                        workspace.cleanup()
+                retrieved.put((paper_name, error))
+            retrieved.put(None)
+
+        with self._lock:
+            threads = [
+                threading.Thread(target=extract_loop, name="batch-extract", daemon=True),
+                threading.Thread(target=retrieve_loop, name="batch-retrieve", daemon=True),
+            ]
+            for thread in threads:
+                thread.start()
+            while (item := retrieved.get()) is not None:
+                paper_name, error = item
+                summary = None
+                if error is None:
+                    try:
+                        summary = self.run_predict(paper_name, paper_progress(paper_name))
+                    except Exception as e:
+                        error = e
+                result_callback(paper_name, summary, error)
+            for thread in threads:
+                thread.join()
+
+
+def skip_stages(names, progress_callback: Optional[ProgressCallback] = None) -> None:
+    """Report stages whose results were reused"""
+    for name in names:
+        with stage(name, progress_callback, cached=True):
+            pass
+
+
+@contextmanager
+def stage(name: str, progress_callback: Optional[ProgressCallback] = None, cached: bool = False):
+    """Emit stage_started / stage_finished events around a pipeline stage"""
+    start = time.time()
+    if progress_callback:
+        progress_callback("stage_started", {"stage": name, "cached": cached})
+    yield
+    if progress_callback:
+        progress_callback("stage_finished", {"stage": name, "cached": cached, "seconds": time.time() - start})
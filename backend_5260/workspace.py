@@ -0,0 +1,71 @@
+"""
+Isolated per-job workspaces.
+
+Every job extracts and retrieves into its own directory,
+SlidesSummarizer/data/.workspaces/<workspace_id>/<paper_name>/, so concurrent
+jobs never write into the same content.json, images/ or retrieval/. Once a
+paper's stages are complete, the directory is committed into the shared
+data/<paper_name>/ by a single rename, which is atomic on the same filesystem;
+readers only ever see a missing or a complete paper directory.
+"""
+
+import os
+import uuid
+import shutil
+import threading
+from typing import Optional
+
+WORKSPACES_DIR = ".workspaces"
+
+# check-then-rename must not interleave between worker threads
+_COMMIT_LOCK = threading.Lock()
+
+
+class Workspace:
+    """
+    Args:
+        data_folder: Shared data folder the workspace commits into
+        paper_name: Paper folder name (data/<paper_name>/ once committed)
+        workspace_id: Unique id, a fresh uuid by default
+    """
+
+    def __init__(self, data_folder: str, paper_name: str, workspace_id: Optional[str] = None):
+        self.data_folder = data_folder
+        self.paper_name = paper_name
+        self.workspace_id = workspace_id or uuid.uuid4().hex
+        # root is usable as the data_folder argument of extract_paper / BaseDataset
+        self.root = os.path.join(data_folder, WORKSPACES_DIR, self.workspace_id)
+        self.paper_dir = os.path.join(self.root, paper_name)
+        self.target_dir = os.path.join(data_folder, paper_name)
+
+    def open(self) -> "Workspace":
+        os.makedirs(self.paper_dir, exist_ok=True)
+        return self
+
+    def commit(self, is_complete) -> bool:
+        """
+        Move the workspace into data/<paper_name>/.
+
+        is_complete(path) tells whether an existing target already holds a
+        finished paper; if so it is kept and this workspace is discarded
+        (another job got there first). An incomplete target is replaced.
+
+        Returns True if this workspace became the committed copy.
+        """
+        with _COMMIT_LOCK:
+            if os.path.exists(self.target_dir):
+                if is_complete(self.target_dir):
+                    return False
+                stale_dir = os.path.join(self.root, "stale")
+                os.rename(self.target_dir, stale_dir)
+            os.rename(self.paper_dir, self.target_dir)
+            return True
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def __enter__(self) -> "Workspace":
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.cleanup()
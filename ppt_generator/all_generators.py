@@ -56,9 +56,13 @@ def md_to_ppt(md_path, theme_path, save_path, img_dic=None):
     print(f"[INFO] Markdown to PPT conversion completed.")
 
 
-def json_to_ppt(json_obj, theme_path, save_path, img_dic=None, inter_md_path=None):
+def json_to_ppt(json_obj, theme_path, save_path, img_dic=None, inter_md_path=None, seed=None):
     """
     Convert JSON to Markdown and then to PPTX.
+
+    save_path may be a file path or a writable binary file-like object (e.g. BytesIO).
+    seed makes the background picks reproducible, so the same input gives the same deck.
+    Returns the number of slides in the generated deck.
     """
     print(f"[INFO] Converting JSON to PPT...")
 
@@ -76,16 +80,21 @@ def json_to_ppt(json_obj, theme_path, save_path, img_dic=None, inter_md_path=Non
         img_dic=img_dic,
         md_str=md_content,
         theme_path=theme_path,
-        save_path=save_path
+        save_path=save_path,
+        seed=seed
     )
 
-    print(f"[INFO] PPT file saved to: {save_path}")
+    if isinstance(save_path, str):
+        print(f"[INFO] PPT file saved to: {save_path}")
     print(f"[INFO] JSON to PPT conversion completed.")
+    return len(ppt_gen.prs.slides)
 
 
 def ppt_to_json(ppt_path, theme_path, output_img_dir=None, inter_md_path=None):
     """
     Convert PPTX directly to JSON string.
+
+    ppt_path may be a file path or a readable binary file-like object (e.g. BytesIO).
     """
     print(f"[INFO] Converting PPT to JSON...")
 
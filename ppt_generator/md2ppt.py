@@ -1,5 +1,6 @@
 import json
 import os
+import random
 from io import BytesIO
 
 import markdown
@@ -52,8 +53,14 @@ class PptGenerator:
     operation_system: str = os_name
 
     def __init__(
-        self, client, img_dic, md_str: str, theme_path: str, save_path: str = PPT_DIR + "test.pptx"
+        self, client, img_dic, md_str: str, theme_path: str, save_path = PPT_DIR + "test.pptx", seed=None
     ) -> None:
+        """
+        save_path can be a file path or a writable binary file-like object
+        (e.g. BytesIO); the PDF export only runs for file paths.
+        seed makes the background picks reproducible (random if None).
+        """
+        self.rng = random.Random(seed)
         self.theme = theme_path
         theme_param_path = os.path.join(self.theme, "mode.json")
         with open(theme_param_path, encoding="utf-8") as f:
@@ -63,15 +70,16 @@ class PptGenerator:
         self.init_markdown(md_str)
         self.client = client
         # generate the title page
-        MD2TitleSlide(self.prs, self.theme, self.ppt_main_theme)
+        MD2TitleSlide(self.prs, self.theme, self.ppt_main_theme, rng=self.rng)
         # prepare the image for the main page
         self.img_dic = img_dic
         # generate the slides
         self.traverse_tree(self.tree)
         # save the ppt
         self.prs.save(save_path)
-        full_path = os.path.abspath(save_path) # get the full path of the ppt
-        self.convert_to_pdf_with_powerpoint(ppt_path=full_path, pdf_path=full_path.replace(".pptx", ".pdf"),os_name=os_name)
+        if isinstance(save_path, str):
+            full_path = os.path.abspath(save_path) # get the full path of the ppt
+            self.convert_to_pdf_with_powerpoint(ppt_path=full_path, pdf_path=full_path.replace(".pptx", ".pdf"),os_name=os_name)
 
 
     def init_pptx(self, theme_path: str = PPT_MODE_DIR + "1") -> None:
@@ -110,13 +118,13 @@ class PptGenerator:
 
             if heading.text_source[:2] == "# ":
                 # First level heading - create Table of Contents
-                MD2Slide(self.prs, self.theme, "Table of Contents", content=content)
+                MD2Slide(self.prs, self.theme, "Table of Contents", content=content, rng=self.rng)
             elif heading.text_source[:3] == "## ":
                 # Second level heading - create a Theme Slide
-                MD2ThemeSlide(self.prs, self.theme, title=heading.text, content=content)
+                MD2ThemeSlide(self.prs, self.theme, title=heading.text, content=content, rng=self.rng)
             else:
                 # Other heading levels (unlikely)
-                MD2Slide(self.prs, self.theme, heading.text, content=content)
+                MD2Slide(self.prs, self.theme, heading.text, content=content, rng=self.rng)
 
         else:
             # When the heading has content
@@ -153,6 +161,7 @@ class PptGenerator:
                     title=title,
                     img_path=img_path,
                     content=input_text.strip(),
+                    rng=self.rng,
                 )
 
         # Recursively traverse the children
@@ -212,9 +221,10 @@ class MD2Slide:
     content_box = (Cm(2.54), Cm(4.12), Cm(20.32), Cm(12.70))
 
     def __init__(
-        self, presentation, theme_path, title, content, *args, img_path='', **kwargs
+        self, presentation, theme_path, title, content, *args, img_path='', rng=None, **kwargs
     ):
         self.presentation = presentation
+        self.rng = rng
         self.slide = presentation.slides.add_slide(presentation.slide_layouts[6])
         self.title = title
         self.content = content
@@ -277,7 +287,7 @@ class MD2Slide:
             self.presentation.slide_height,
         )
         # add picture
-        img_path = get_random_file(self.img_theme)
+        img_path = get_random_file(self.img_theme, self.rng)
         picture = self.slide.shapes.add_picture(img_path, *img_box)
         # picture.left = 0
         # picture.top = 0
@@ -371,8 +381,9 @@ class MD2ThemeSlide:
     title_box = (Cm(0), Cm(0), Cm(0), Cm(0))
     content_box = (Cm(0), Cm(0), Cm(0), Cm(0))
 
-    def __init__(self, presentation, theme_path, title, content="", *args, img_path='', **kwargs):
+    def __init__(self, presentation, theme_path, title, content="", *args, img_path='', rng=None, **kwargs):
         self.presentation = presentation
+        self.rng = rng
         self.slide = self.presentation.slides.add_slide(self.presentation.slide_layouts[6])
         self.title = title
         self.content = content
@@ -413,7 +424,7 @@ class MD2ThemeSlide:
             self.presentation.slide_width,
             self.presentation.slide_height,
         )
-        img_path = get_random_file(self.img_theme)
+        img_path = get_random_file(self.img_theme, self.rng)
         picture = self.slide.shapes.add_picture(img_path, *img_box)
 
     def init_font(self, **kwargs):
@@ -492,8 +503,9 @@ class MD2TitleSlide:
     font_title_size: Pt = Pt(40)
     title_box = (Cm(2.81), Cm(5.44), Cm(21.59), Cm(4.08))
 
-    def __init__(self, presentation, theme_path, title, *args, **kwargs):
+    def __init__(self, presentation, theme_path, title, *args, rng=None, **kwargs):
         self.presentation = presentation
+        self.rng = rng
         self.slide = presentation.slides.add_slide(presentation.slide_layouts[6])
         self.title = title
         self.theme = theme_path
@@ -521,7 +533,7 @@ class MD2TitleSlide:
         elif os.path.exists(os.path.join(self.theme, "title.png")):
             path = os.path.join(self.theme, "title.png")
         else:
-            path = get_random_file(self.img_theme)
+            path = get_random_file(self.img_theme, self.rng)
         left, top, width, height = (Cm(0), Cm(0), Cm(25.4), Cm(14.29))
         picture = self.slide.shapes.add_picture(path, left, top, width, height)
         # set the width and height
@@ -12,7 +12,7 @@ class PptToMarkdownConverter:
     def __init__(self, ppt_path, theme_path, output_img_dir=None, output_md_path=None):
         """
         Args:
-            ppt_path (str): Input PPTX file path.
+            ppt_path (str or file-like): Input PPTX file path or binary stream.
             output_md_path (str): Output Markdown file path.
             output_img_dir (str or None): Output image directory. If None, do not extract images.
             theme_path (str): Parent path to the mode.json that defines theme page title_box.
@@ -34,13 +34,14 @@ def get_sublist(text):
     return matches
 
 
-def get_random_file(path):
+def get_random_file(path, rng=None):
     """
-    Get a random image file from a folder
+    Get a random image file from a folder.
+    Pass a seeded random.Random as rng to make the choice reproducible.
     """
     folder_path = path
-    files = os.listdir(folder_path)
-    random_file = random.choice(files)
+    files = sorted(os.listdir(folder_path))
+    random_file = (rng or random).choice(files)
     random_file_path = os.path.join(folder_path, random_file)
     return random_file_path
 